@@ -1,8 +1,12 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.cache import cache
 from django.utils.html import format_html
 from django.urls import reverse
 from django.db import models
-from .models import ClientPreference, Booking, BookingService
+from staff.versioning import get_catalog_version
+from .models import ClientPreference, Booking, BookingService, SweepRun
+from .paginator import EstimatedCountPaginator
+from .transitions import apply_transition
 
 
 class BookingServiceInline(admin.TabularInline):
@@ -18,6 +22,43 @@ class BookingServiceInline(admin.TabularInline):
         return formset
 
 
+class TotalCostFilter(admin.SimpleListFilter):
+    """Фильтр по диапазону стоимости записи (по полю total_cost)"""
+    title = 'Стоимость'
+    parameter_name = 'cost'
+    RANGES = {
+        'lt1000': ('до 1000 ₽', None, 1000),
+        '1000-3000': ('1000–3000 ₽', 1000, 3000),
+        '3000-5000': ('3000–5000 ₽', 3000, 5000),
+        'gte5000': ('от 5000 ₽', 5000, None),
+    }
+
+    def lookups(self, request, model_admin):
+        return [(key, label) for key, (label, _, _) in self.RANGES.items()]
+
+    def queryset(self, request, queryset):
+        if self.value() not in self.RANGES:
+            return queryset
+        _, low, high = self.RANGES[self.value()]
+        if low is not None:
+            queryset = queryset.filter(total_cost__gte=low)
+        if high is not None:
+            queryset = queryset.filter(total_cost__lt=high)
+        return queryset
+
+
+class CachedMasterFilter(admin.RelatedFieldListFilter):
+    """Фильтр по мастеру: список мастеров кэшируется до смены каталога"""
+
+    def field_choices(self, field, request, model_admin):
+        key = f'admin:booking_master_choices:{get_catalog_version()}'
+        choices = cache.get(key)
+        if choices is None:
+            choices = list(super().field_choices(field, request, model_admin))
+            cache.set(key, choices, 60 * 60)
+        return choices
+
+
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
     list_display = (
@@ -31,8 +72,9 @@ class BookingAdmin(admin.ModelAdmin):
     )
     list_filter = (
         'status',
-        'master',
+        ('master', CachedMasterFilter),
         ('visit_datetime', admin.DateFieldListFilter),
+        TotalCostFilter,
         'created_at'
     )
     search_fields = (
@@ -43,6 +85,12 @@ class BookingAdmin(admin.ModelAdmin):
         'master__last_name'
     )
     date_hierarchy = 'visit_datetime'
+    # Клиент и мастер одним JOIN, стоимость хранится в total_cost —
+    # страница списка не делает запросов на каждую строку
+    list_select_related = ('user', 'master')
+    # Без второго COUNT(*) по всей таблице при фильтрации
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
     inlines = [BookingServiceInline]
     actions = ['mark_confirmed', 'mark_cancelled', 'mark_completed']
 
@@ -51,11 +99,23 @@ class BookingAdmin(admin.ModelAdmin):
             'fields': ('user', 'master', 'visit_datetime')
         }),
         ('Статус', {
-            'fields': ('status',),
+            'fields': (
+                'status', 'confirmed_at', 'cancelled_at', 'completed_at'
+            ),
             'classes': ('collapse',)
         }),
     )
 
+    readonly_fields = ('confirmed_at', 'cancelled_at', 'completed_at')
+
+    def get_readonly_fields(self, request, obj=None):
+        # Статус существующей записи меняется только действиями списка:
+        # они проверяют переход и обновляют счётчики (transitions.py)
+        readonly = super().get_readonly_fields(request, obj)
+        if obj is not None:
+            readonly = (*readonly, 'status')
+        return readonly
+
     # Сортировка в форме
     ordering = ('-visit_datetime',)
 
@@ -91,26 +151,35 @@ class BookingAdmin(admin.ModelAdmin):
     def total_cost_display(self, obj):
         return f"{obj.total_cost} ₽"
     total_cost_display.short_description = 'Стоимость'
-    total_cost_display.admin_order_field = 'booking_services__service__price'
+    total_cost_display.admin_order_field = 'total_cost'
 
     # === Действия (actions) ===
 
+    def _apply_transition(self, request, queryset, status, verb):
+        result = apply_transition(queryset, status)
+        message = f'{verb} {result.applied} записей.'
+        if result.rejected:
+            message += (
+                f' Пропущено {result.rejected}: переход из их статуса'
+                ' недопустим.'
+            )
+        self.message_user(
+            request, message,
+            messages.WARNING if result.rejected else messages.SUCCESS
+        )
+
     def mark_confirmed(self, request, queryset):
-        updated = queryset.update(status='confirmed')
-        self.message_user(request, f'Подтверждено {updated} записей.')
+        self._apply_transition(request, queryset, 'confirmed', 'Подтверждено')
     mark_confirmed.short_description = '✅ Подтвердить выбранные записи'
 
     def mark_cancelled(self, request, queryset):
-        updated = queryset.update(status='cancelled')
-        self.message_user(request, f'Отменено {updated} записей.')
+        self._apply_transition(request, queryset, 'cancelled', 'Отменено')
     mark_cancelled.short_description = '❌ Отменить выбранные записи'
 
     def mark_completed(self, request, queryset):
-        updated = queryset.update(status='completed')
-        self.message_user(request, f'Завершено {updated} записей.')
+        # Завершаются только подтверждённые записи с прошедшим визитом
+        self._apply_transition(request, queryset, 'completed', 'Завершено')
     mark_completed.short_description = '✔️ Завершить выбранные записи'
-
-    # Защита от массового изменения статуса «Завершена» без даты в прошлом
     mark_completed.allowed_permissions = ('change',)
 
 
@@ -123,3 +192,17 @@ class ClientPreferenceAdmin(admin.ModelAdmin):
     def preferred_masters_list(self, obj):
         return ", ".join(str(m) for m in obj.preferred_masters.all()[:3])
     preferred_masters_list.short_description = 'Предпочтительные мастера'
+
+
+@admin.register(SweepRun)
+class SweepRunAdmin(admin.ModelAdmin):
+    list_display = (
+        'started_at', 'finished_at', 'expired', 'completed', 'batches'
+    )
+    date_hierarchy = 'started_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
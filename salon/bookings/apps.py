@@ -8,6 +8,7 @@ class BookingsConfig(AppConfig):
     verbose_name = _('Записи клиентов')
 
     def ready(self):
-        # Импортируем сигналы (если будут добавлены позже)
-        # from . import signals
-        pass
\ No newline at end of file
+        # Сигналы сбрасывают кэш расписаний мастеров и настраивают
+        # соединения SQLite
+        from . import signals  # noqa: F401
+
@@ -0,0 +1,289 @@
+"""Движок свободных слотов мастера.
+
+Занятость мастера за день хранится в отсортированном списке интервалов
+[начало, конец). Конец каждой записи (Booking.end_datetime) считается по
+индивидуальному времени мастера (MasterService.duration_minutes) для её
+услуг, поэтому длинные записи, начавшиеся раньше, тоже учитываются.
+
+Расписание дня загружается одним запросом и кэшируется; кэш
+сбрасывается сигналами при изменении записей (см. bookings/signals.py).
+"""
+from bisect import bisect_left
+from datetime import datetime, time, timedelta
+from collections import defaultdict
+from itertools import accumulate, islice
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from staff.models import MasterService
+from .models import Booking
+
+# Шаг сетки свободных слотов, мин
+SLOT_STEP = 15
+# Часы работы салона по дням недели (0 — понедельник)
+WORK_HOURS = {
+    0: (time(10), time(21)),
+    1: (time(10), time(21)),
+    2: (time(10), time(21)),
+    3: (time(10), time(21)),
+    4: (time(10), time(21)),
+    5: (time(10), time(20)),
+    6: (time(11), time(19)),
+}
+CACHE_TIMEOUT = 60 * 10
+
+
+def day_bounds(day):
+    """Начало и конец дня в текущей временной зоне."""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def work_bounds(day):
+    """Открытие и закрытие салона в указанный день."""
+    opens, closes = WORK_HOURS[day.weekday()]
+    day_start, _ = day_bounds(day)
+    return (
+        day_start + timedelta(hours=opens.hour, minutes=opens.minute),
+        day_start + timedelta(hours=closes.hour, minutes=closes.minute),
+    )
+
+
+def overlapping(master_id, start, end):
+    """Активные записи мастера, пересекающие [start, end).
+
+    Один предикат по частичному индексу активных записей
+    booking_active_master_idx, без JOIN к услугам.
+    """
+    return Booking.objects.filter(
+        master_id=master_id,
+        status__active=True,
+        visit_datetime__lt=end,
+        end_datetime__gt=start,
+    )
+
+
+class DaySchedule:
+    """Занятость мастера за один день.
+
+    Интервалы отсортированы по началу; для каждой позиции хранится
+    максимальный конец среди предыдущих интервалов, поэтому проверка
+    пересечения — один бинарный поиск, O(log n).
+    """
+
+    def __init__(self, intervals=()):
+        intervals = sorted(intervals)
+        self.intervals = intervals
+        self._starts = [start for start, _, _ in intervals]
+        self._max_ends = list(accumulate(
+            (end for _, end, _ in intervals), max
+        ))
+
+    @classmethod
+    def load(cls, master_id, day):
+        """Одна выборка активных записей мастера, задевающих день."""
+        day_start, day_end = day_bounds(day)
+        rows = overlapping(master_id, day_start, day_end).values_list(
+            'visit_datetime', 'end_datetime', 'pk'
+        )
+        return cls(rows)
+
+    def without(self, pk):
+        """Копия расписания без указанной записи (для редактирования)."""
+        if pk is None:
+            return self
+        return DaySchedule(i for i in self.intervals if i[2] != pk)
+
+    def is_free(self, start, end):
+        """Свободен ли полуинтервал [start, end)."""
+        # Последний интервал, начавшийся до конца проверяемого
+        idx = bisect_left(self._starts, end) - 1
+        return idx < 0 or self._max_ends[idx] <= start
+
+    def iter_free_slots(self, day, duration, step=SLOT_STEP, not_before=None,
+                        bounds=None):
+        """Начала свободных окон длиной duration минут в часы работы.
+
+        Расписание может охватывать несколько дней: просмотр начинается
+        с бинарного поиска начала рабочего дня. bounds — заранее
+        посчитанный work_bounds(day).
+        """
+        work_start, work_end = bounds or work_bounds(day)
+        length = timedelta(minutes=duration)
+        step = timedelta(minutes=step)
+
+        def align(moment):
+            # Ближайшая точка сетки от начала рабочего дня не раньше moment
+            if moment <= work_start:
+                return work_start
+            return work_start + -(-(moment - work_start) // step) * step
+
+        cursor = align(not_before) if not_before else work_start
+        idx = bisect_left(self._starts, work_start)
+        # Записи, начавшиеся до открытия и ещё не закончившиеся
+        if idx and self._max_ends[idx - 1] > cursor:
+            cursor = align(self._max_ends[idx - 1])
+
+        # Один проход по отсортированным интервалам: перебираем промежутки
+        for start, end, _ in islice(self.intervals, idx, None):
+            if start >= work_end:
+                break
+            while cursor + length <= start:
+                yield cursor
+                cursor += step
+            if end > cursor:
+                cursor = align(end)
+        while cursor + length <= work_end:
+            yield cursor
+            cursor += step
+
+    def free_slots(self, day, duration, step=SLOT_STEP, not_before=None):
+        return list(self.iter_free_slots(day, duration, step, not_before))
+
+
+def _cache_key(master_id, day):
+    return f'availability:{master_id}:{day.isoformat()}'
+
+
+def get_schedule(master_id, day):
+    """Расписание мастера на день из кэша или одной выборкой из БД."""
+    key = _cache_key(master_id, day)
+    intervals = cache.get(key)
+    if intervals is None:
+        intervals = DaySchedule.load(master_id, day).intervals
+        cache.set(key, intervals, CACHE_TIMEOUT)
+    return DaySchedule(intervals)
+
+
+def invalidate(master_id, visit_datetime):
+    """Сбрасывает кэш дней, которые может задевать запись.
+
+    Внутри транзакции кэш сбрасывается ещё раз после COMMIT: до него
+    параллельный запрос мог закэшировать старое расписание.
+    """
+    day = timezone.localtime(visit_datetime).date()
+    keys = [
+        _cache_key(master_id, day),
+        _cache_key(master_id, day + timedelta(days=1)),
+    ]
+    cache.delete_many(keys)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def days_between(start, end):
+    """Дни (в текущей зоне), которые задевает интервал [start, end)."""
+    day = timezone.localtime(start).date()
+    last_day = timezone.localtime(end - timedelta(microseconds=1)).date()
+    days = []
+    while day <= last_day:
+        days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def is_slot_free(master_id, start, end, exclude_pk=None):
+    """Свободен ли у мастера интервал [start, end)."""
+    return all(
+        get_schedule(master_id, day).without(exclude_pk).is_free(start, end)
+        for day in days_between(start, end)
+    )
+
+
+def free_slots(master_id, day, duration, step=SLOT_STEP):
+    """Свободные времена начала визита к мастеру на день."""
+    return get_schedule(master_id, day).free_slots(
+        day, duration, step, not_before=timezone.now()
+    )
+
+
+def window_schedules(master_ids, window_start, window_end):
+    """Расписания мастеров за окно одним запросом: {master_id: DaySchedule}."""
+    busy = defaultdict(list)
+    for master_id, start, end, pk in Booking.objects.filter(
+        master_id__in=master_ids,
+        status__active=True,
+        visit_datetime__lt=window_end,
+        end_datetime__gt=window_start,
+    ).values_list('master_id', 'visit_datetime', 'end_datetime', 'pk'):
+        busy[master_id].append((start, end, pk))
+    return {
+        master_id: DaySchedule(busy[master_id]) for master_id in master_ids
+    }
+
+
+def earliest_slot(service_ids, window_start, window_end, step=SLOT_STEP):
+    """Самое раннее свободное время у любого мастера для набора услуг.
+
+    Кандидаты — опубликованные мастера, оказывающие все услуги; их
+    длительности и записи за окно читаются двумя запросами, дальше
+    дни окна обходятся по порядку по отсортированным интервалам.
+    Возвращает (master_id, начало, длительность) или None.
+    """
+    service_ids = set(service_ids)
+    durations = dict(
+        MasterService.objects.filter(
+            master__is_published=True,
+            service_id__in=service_ids,
+            service__is_published=True,
+        ).values('master_id').annotate(
+            offered=Count('service_id'),
+            total=Sum('duration_minutes'),
+        ).filter(offered=len(service_ids)).values_list('master_id', 'total')
+    )
+    if not durations:
+        return None
+
+    schedules = window_schedules(durations, window_start, window_end)
+
+    not_before = max(window_start, timezone.now())
+    day = timezone.localtime(window_start).date()
+    last_day = timezone.localtime(window_end).date()
+    while day <= last_day:
+        best = None
+        bounds = work_bounds(day)
+        for master_id, schedule in schedules.items():
+            duration = durations[master_id]
+            start = next(schedule.iter_free_slots(
+                day, duration, step, not_before=not_before, bounds=bounds
+            ), None)
+            if start is None:
+                continue
+            if start + timedelta(minutes=duration) > window_end:
+                continue
+            if best is None or start < best[1]:
+                best = (master_id, start, duration)
+        if best:
+            return best
+        day += timedelta(days=1)
+    return None
+
+
+def next_free_slots(durations, window_start, window_end, step=SLOT_STEP):
+    """Ближайшее свободное время каждого мастера.
+
+    durations — {master_id: длительность в минутах}. Записи всех мастеров
+    за окно читаются одним запросом. Возвращает {master_id: начало или
+    None, если в окне свободного времени нет}.
+    """
+    schedules = window_schedules(durations, window_start, window_end)
+    not_before = max(window_start, timezone.now())
+    last_day = timezone.localtime(window_end).date()
+    slots = {}
+    for master_id, schedule in schedules.items():
+        duration = durations[master_id]
+        slots[master_id] = None
+        day = timezone.localtime(window_start).date()
+        while day <= last_day:
+            start = next(schedule.iter_free_slots(
+                day, duration, step, not_before=not_before
+            ), None)
+            if start is not None:
+                if start + timedelta(minutes=duration) <= window_end:
+                    slots[master_id] = start
+                break
+            day += timedelta(days=1)
+    return slots
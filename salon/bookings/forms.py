@@ -2,6 +2,7 @@ from django import forms
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from staff.models import Master, Service, MasterService
+from .services import validate_booking
 
 
 class BookingForm(forms.Form):
@@ -65,43 +66,17 @@ class BookingForm(forms.Form):
         if not (master and services and visit_datetime):
             return cleaned_data
 
-        # Проверка: услуги должны быть в арсенале мастера
-        invalid_services = []
-        total_duration = 0
-
-        for service in services:
-            try:
-                ms = MasterService.objects.get(master=master, service=service)
-                total_duration += ms.duration_minutes
-            except MasterService.DoesNotExist:
-                invalid_services.append(service.title)
-
-        if invalid_services:
-            raise ValidationError(
-                f'Мастер не оказывает услуги: {", ".join(invalid_services)}.'
+        # Все длительности услуг мастера одним запросом: {service_id: минуты}
+        self.durations = dict(
+            MasterService.objects.filter(master=master).values_list(
+                'service_id', 'duration_minutes'
             )
-
-        # Проверка пересечения времени
-        start = visit_datetime
-        end = start + timezone.timedelta(minutes=total_duration)
-
-        from .models import Booking
-        overlapping = Booking.objects.filter(
-            master=master,
-            status__in=['pending', 'confirmed'],
-            visit_datetime__lt=end,
-            visit_datetime__gt=start - timezone.timedelta(minutes=total_duration)
         )
 
-        # Исключаем текущую запись при редактировании
-        if self.initial.get('booking_id'):
-            overlapping = overlapping.exclude(pk=self.initial['booking_id'])
-
-        if overlapping.exists():
-            raise ValidationError(
-                'Выбранное время занято. Попробуйте другое время или другого мастера.'
-            )
-
-        # Сохраняем рассчитанную длительность для использования в view
-        self.duration_minutes = total_duration
+        # Проверка услуг мастера и пересечения времени по загруженным данным;
+        # текущую запись при редактировании исключаем
+        self.duration_minutes = validate_booking(
+            master, services, visit_datetime, self.durations,
+            exclude_pk=self.initial.get('booking_id')
+        )
         return cleaned_data
@@ -0,0 +1,133 @@
+"""Пропускная способность создания записей на текущей базе.
+
+Несколько потоков одновременно создают записи через create_booking —
+так же, как это делает BookingCreateView. Конфигурация базы берётся из
+окружения (см. .env.example), поэтому режимы сравниваются запуском
+команды с разными переменными, например:
+
+    python manage.py bench_booking_create
+    DB_SQLITE_JOURNAL_MODE=DELETE DB_SQLITE_SYNCHRONOUS=FULL \\
+        python manage.py bench_booking_create
+    DB_ENGINE=postgresql python manage.py bench_booking_create
+
+Команда создаёт временных мастеров, услуги и клиентов и удаляет их
+после замера.
+"""
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, connection
+from django.utils import timezone
+
+from bookings.retry import reset_retry_stats, retry_stats
+from bookings.services import create_booking
+from staff.models import Master, MasterService, Service
+
+SERVICE_MINUTES = 30
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк создания записей в несколько потоков.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bookings', type=int, default=2000)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--masters', type=int, default=4,
+                            help='Записи распределяются по мастерам.')
+
+    def handle(self, *args, **options):
+        settings_dict = connection.settings_dict
+        self.stdout.write(
+            f'База: {connection.vendor} {settings_dict["NAME"]}, '
+            f'CONN_MAX_AGE={settings_dict["CONN_MAX_AGE"]}'
+        )
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                pragmas = {
+                    name: cursor.execute(f'PRAGMA {name}').fetchone()[0]
+                    for name in ('journal_mode', 'synchronous', 'busy_timeout')
+                }
+            self.stdout.write(f'PRAGMA: {pragmas}')
+
+        tag = uuid.uuid4().hex[:8]
+        masters, services, users = self.setup(tag, options)
+        try:
+            self.run(masters, services, users, options)
+        finally:
+            get_user_model().objects.filter(
+                pk__in=[u.pk for u in users]
+            ).delete()
+            Master.objects.filter(pk__in=[m.pk for m in masters]).delete()
+            Service.objects.filter(pk=services[0].pk).delete()
+
+    def setup(self, tag, options):
+        service = Service.objects.create(
+            title=f'bench-{tag}', price=1000,
+            duration_minutes=SERVICE_MINUTES
+        )
+        masters = [
+            Master.objects.create(first_name='bench', last_name=f'{tag}-{i}')
+            for i in range(options['masters'])
+        ]
+        MasterService.objects.bulk_create([
+            MasterService(master=master, service=service,
+                          duration_minutes=SERVICE_MINUTES)
+            for master in masters
+        ])
+        User = get_user_model()
+        User.objects.bulk_create([
+            User(username=f'bench-{tag}-{i}')
+            for i in range(options['threads'])
+        ])
+        users = list(User.objects.filter(username__startswith=f'bench-{tag}-'))
+        return masters, [service], users
+
+    def run(self, masters, services, users, options):
+        total = options['bookings']
+        start = timezone.now().replace(
+            minute=0, second=0, microsecond=0
+        ) + timedelta(days=1)
+        durations = {services[0].pk: SERVICE_MINUTES}
+        threads = len(users)
+
+        def work(worker):
+            created = failed = 0
+            try:
+                for n in range(worker, total, threads):
+                    master = masters[n % len(masters)]
+                    when = start + timedelta(
+                        minutes=SERVICE_MINUTES * (n // len(masters))
+                    )
+                    try:
+                        create_booking(
+                            users[worker], master, services, when, durations
+                        )
+                        created += 1
+                    except (ValidationError, DatabaseError):
+                        failed += 1
+            finally:
+                close_old_connections()
+                connection.close()
+            return created, failed
+
+        reset_retry_stats()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(work, range(threads)))
+        elapsed = time.perf_counter() - started
+
+        created = sum(c for c, _ in results)
+        failed = sum(f for _, f in results)
+        stats = retry_stats()
+        self.stdout.write(
+            f'Потоков: {threads}, записей: {created} за {elapsed:.2f} с '
+            f'({created / elapsed:.0f} в секунду), ошибок: {failed}\n'
+            f'Конфликтов блокировок: {stats["conflicts"]}, '
+            f'повторов: {stats["retries"]}, '
+            f'исчерпано попыток: {stats["exhausted"]}'
+        )
@@ -0,0 +1,212 @@
+"""Сравнение индексов таблицы записей на синтетических данных.
+
+Создаёт отдельный файл SQLite с таблицей bookings_booking, заполняет её
+синтетическими записями (по умолчанию 5 млн, ~90% — отменённые и
+завершённые), затем для старого и текущего набора индексов показывает
+план (EXPLAIN QUERY PLAN) и задержку горячих запросов: проверки
+пересечений и «Моих записей». Рабочая база не затрагивается.
+"""
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import connection, models
+from django.utils import timezone
+
+from bookings.availability import overlapping
+from bookings.models import Booking
+
+# Индексы Booking до частичных индексов (состояние после миграции 0011)
+LEGACY_INDEXES = [
+    models.Index(fields=['user', 'status'],
+                 name='bookings_bo_user_id_69a5d5_idx'),
+    models.Index(fields=['master', 'visit_datetime'],
+                 name='bookings_bo_master__d9760c_idx'),
+    models.Index(fields=['master', 'status', 'visit_datetime', 'end_datetime'],
+                 name='bookings_bo_master__447b09_idx'),
+    models.Index(fields=['total_cost'],
+                 name='bookings_bo_total_c_cfe193_idx'),
+]
+
+MASTERS = 100
+USERS = 100000
+HISTORY_DAYS = 730
+FUTURE_DAYS = 60
+INSERT_CHUNK = 50000
+DEFAULT_PATH = str(Path(tempfile.gettempdir()) / 'bench_bookings.sqlite3')
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк индексов таблицы записей на синтетических данных.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000000)
+        parser.add_argument('--repeat', type=int, default=200,
+                            help='Сколько раз выполнять каждый запрос.')
+        parser.add_argument('--path', default=DEFAULT_PATH,
+                            help='Файл базы для бенчмарка (перезаписывается).')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if path.exists():
+            path.unlink()
+        db = sqlite3.connect(path)
+        db.execute('PRAGMA journal_mode = OFF')
+        db.execute('PRAGMA synchronous = OFF')
+
+        base_sql, _ = self.schema_sql([])
+        for sql in base_sql:
+            db.execute(sql)
+        self.stdout.write(f'Заполнение {options["rows"]} записей...')
+        started = time.perf_counter()
+        self.fill(db, options['rows'])
+        self.stdout.write(f'  {time.perf_counter() - started:.1f} с')
+
+        for title, indexes in (
+            ('Старые индексы', LEGACY_INDEXES),
+            ('Текущие индексы', Booking._meta.indexes),
+        ):
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            _, index_sql = self.schema_sql(indexes)
+            self.drop_indexes(db)
+            started = time.perf_counter()
+            for sql in index_sql:
+                db.execute(sql)
+            db.execute('ANALYZE')
+            self.stdout.write(
+                f'  построение: {time.perf_counter() - started:.1f} с'
+            )
+            self.report_sizes(db, indexes)
+            for name, make_query in self.queries():
+                self.measure(db, name, make_query, options['repeat'])
+
+        db.close()
+
+    def schema_sql(self, indexes):
+        """SQL создания таблицы (с индексами FK) и заданных индексов."""
+        meta_names = {index.name for index in Booking._meta.indexes}
+        with connection.schema_editor(
+            collect_sql=True, atomic=False
+        ) as editor:
+            editor.create_model(Booking)
+            index_sql = [
+                str(index.create_sql(Booking, editor)) for index in indexes
+            ]
+        base_sql = [
+            sql for sql in editor.collected_sql
+            if not any(f'"{name}"' in sql for name in meta_names)
+        ]
+        return base_sql, index_sql
+
+    def report_sizes(self, db, indexes):
+        try:
+            sizes = dict(db.execute(
+                'SELECT name, SUM(pgsize) FROM dbstat GROUP BY name'
+            ))
+        except sqlite3.OperationalError:
+            # SQLite собран без dbstat
+            return
+        for index in indexes:
+            size = sizes.get(index.name, 0) / 2 ** 20
+            self.stdout.write(f'    {index.name}: {size:.1f} МБ')
+
+    def drop_indexes(self, db):
+        # Индексы по FK (user_id, master_id) общие для обоих наборов
+        names = [
+            row[0] for row in db.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' "
+                "AND tbl_name = 'bookings_booking' AND sql IS NOT NULL "
+                "AND name NOT LIKE 'bookings_booking_%'"
+            )
+        ]
+        for name in names:
+            db.execute(f'DROP INDEX "{name}"')
+
+    def fill(self, db, rows):
+        now = timezone.now().replace(minute=0, second=0, microsecond=0)
+        adapt = connection.ops.adapt_datetimefield_value
+        columns = (
+            'user_id, master_id, visit_datetime, duration_minutes, '
+            'end_datetime, total_cost, status, created_at, updated_at'
+        )
+        sql = (
+            f'INSERT INTO bookings_booking ({columns}) '
+            f'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+        )
+        rnd = random.Random(42)
+        for offset in range(0, rows, INSERT_CHUNK):
+            chunk = []
+            for _ in range(min(INSERT_CHUNK, rows - offset)):
+                if rnd.random() < 0.9:
+                    days = -rnd.randint(1, HISTORY_DAYS)
+                    status = rnd.choice(('cancelled', 'completed'))
+                else:
+                    days = rnd.randint(0, FUTURE_DAYS)
+                    status = rnd.choice(('pending', 'confirmed'))
+                start = now + timedelta(days=days, hours=rnd.randint(-12, 8))
+                duration = rnd.choice((30, 45, 60, 90, 120))
+                chunk.append((
+                    rnd.randint(1, USERS), rnd.randint(1, MASTERS),
+                    adapt(start), duration,
+                    adapt(start + timedelta(minutes=duration)),
+                    '1500', status, adapt(now), adapt(now),
+                ))
+            db.executemany(sql, chunk)
+        db.commit()
+
+    def queries(self):
+        """Горячие запросы в том виде, в каком их строит ORM."""
+        now = timezone.now()
+        rnd = random.Random(7)
+
+        def overlap():
+            start = now + timedelta(days=rnd.randint(0, FUTURE_DAYS),
+                                    hours=rnd.randint(0, 10))
+            return overlapping(
+                rnd.randint(1, MASTERS), start, start + timedelta(hours=1)
+            ).values_list('visit_datetime', 'end_datetime', 'pk')
+
+        def my_bookings():
+            return Booking.objects.filter(
+                user_id=rnd.randint(1, USERS)
+            ).order_by('-visit_datetime').values_list('pk')[:10]
+
+        return (
+            ('Пересечение (availability.overlapping)', overlap),
+            ('Мои записи (MyBookingsView)', my_bookings),
+        )
+
+    def measure(self, db, name, make_query, repeat):
+        plan = '; '.join(
+            row[-1] for row in db.execute(
+                *self.compile(make_query(), explain=True)
+            )
+        )
+        timings = []
+        for _ in range(repeat):
+            sql, params = self.compile(make_query())
+            started = time.perf_counter()
+            db.execute(sql, params).fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        self.stdout.write(
+            f'  {name}\n'
+            f'    план: {plan}\n'
+            f'    медиана: {statistics.median(timings):.3f} мс, '
+            f'p95: {timings[int(len(timings) * 0.95) - 1]:.3f} мс'
+        )
+
+    def compile(self, queryset, explain=False):
+        sql, params = queryset.query.get_compiler(
+            connection=connection
+        ).as_sql()
+        # Параметры в стиле sqlite3 вместо %s
+        sql = sql.replace('%s', '?')
+        if explain:
+            sql = f'EXPLAIN QUERY PLAN {sql}'
+        return sql, params
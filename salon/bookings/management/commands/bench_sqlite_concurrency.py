@@ -0,0 +1,207 @@
+"""Конкуренция чтения и записи в SQLite: журнал по умолчанию против WAL.
+
+Во временном файле SQLite создаётся таблица записей с синтетическими
+данными. Затем одновременно работают писатель (транзакции создания
+записи: проверка пересечения и вставка, как в create_booking) и
+несколько читателей (запросы «Моих записей» и проверки пересечения).
+Для каждого режима печатаются пропускная способность писателя,
+задержка чтений и число ошибок «database is locked».
+
+Режимы:
+- журнал DELETE без настроек — как SQLite по умолчанию;
+- settings.SQLITE_PRAGMAS, читатели с SQLITE_READ_PRAGMAS — как
+  соединения default и READ_DATABASE в проекте.
+"""
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from bookings.availability import overlapping
+from bookings.models import Booking
+
+MASTERS = 20
+USERS = 2000
+DEFAULT_PATH = str(Path(tempfile.gettempdir()) / 'bench_concurrency.sqlite3')
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк одновременных чтений и записей в SQLite.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200000)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--path', default=DEFAULT_PATH,
+                            help='Файл базы для бенчмарка (перезаписывается).')
+
+    def handle(self, *args, **options):
+        plain = {'journal_mode': 'DELETE', 'synchronous': 'FULL',
+                 'busy_timeout': 0}
+        tuned = dict(settings.SQLITE_PRAGMAS)
+        read_tuned = {**tuned, **settings.SQLITE_READ_PRAGMAS}
+        for title, write_pragmas, read_pragmas in (
+            ('Журнал DELETE, без настроек', plain, plain),
+            ('SQLITE_PRAGMAS (WAL), читатели только для чтения',
+             tuned, read_tuned),
+        ):
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            path = self.prepare(Path(options['path']), options['rows'])
+            self.run(path, write_pragmas, read_pragmas, options)
+
+    def connect(self, path, pragmas):
+        db = sqlite3.connect(path, isolation_level=None,
+                             check_same_thread=False, timeout=0)
+        for name, value in pragmas.items():
+            db.execute(f'PRAGMA {name} = {value}')
+        return db
+
+    def prepare(self, path, rows):
+        for suffix in ('', '-wal', '-shm'):
+            Path(f'{path}{suffix}').unlink(missing_ok=True)
+        db = sqlite3.connect(path)
+        with connection.schema_editor(
+            collect_sql=True, atomic=False
+        ) as editor:
+            editor.create_model(Booking)
+        for sql in editor.collected_sql:
+            db.execute(sql)
+        rnd = random.Random(42)
+        now = timezone.now()
+        adapt = connection.ops.adapt_datetimefield_value
+        data = []
+        for _ in range(rows):
+            start = now + timedelta(days=rnd.randint(-365, 30),
+                                    hours=rnd.randint(0, 10))
+            data.append(self.row(rnd, start, rnd.choice(
+                ('pending', 'confirmed', 'cancelled', 'completed')
+            ), adapt, now))
+        db.executemany(self.insert_sql(), data)
+        db.commit()
+        db.execute('ANALYZE')
+        db.close()
+        return path
+
+    def insert_sql(self):
+        return (
+            'INSERT INTO bookings_booking (user_id, master_id, '
+            'visit_datetime, duration_minutes, end_datetime, total_cost, '
+            'status, created_at, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+        )
+
+    def row(self, rnd, start, status, adapt, now):
+        return (
+            rnd.randint(1, USERS), rnd.randint(1, MASTERS), adapt(start), 60,
+            adapt(start + timedelta(hours=1)), '1500', status,
+            adapt(now), adapt(now),
+        )
+
+    def compile(self, queryset):
+        sql, params = queryset.query.get_compiler(
+            connection=connection
+        ).as_sql()
+        return sql.replace('%s', '?'), params
+
+    def run(self, path, write_pragmas, read_pragmas, options):
+        stop = threading.Event()
+        adapt = connection.ops.adapt_datetimefield_value
+        now = timezone.now()
+        writes = []
+        write_errors = [0]
+        reads = []
+        read_errors = [0]
+        lock = threading.Lock()
+
+        # Соединения открываются заранее: PRAGMA journal_mode сама
+        # берёт блокировку
+        write_db = self.connect(path, write_pragmas)
+        read_dbs = [
+            self.connect(path, read_pragmas)
+            for _ in range(options['readers'])
+        ]
+
+        def writer():
+            db = write_db
+            rnd = random.Random(1)
+            while not stop.is_set():
+                start = now + timedelta(days=rnd.randint(1, 30),
+                                        minutes=15 * rnd.randint(0, 40))
+                master_id = rnd.randint(1, MASTERS)
+                started = time.perf_counter()
+                try:
+                    db.execute('BEGIN IMMEDIATE')
+                    sql, params = self.compile(overlapping(
+                        master_id, start, start + timedelta(hours=1)
+                    ).values('pk')[:1])
+                    if db.execute(sql, params).fetchone() is None:
+                        row = list(self.row(rnd, start, 'pending', adapt, now))
+                        row[1] = master_id
+                        db.execute(self.insert_sql(), row)
+                    db.execute('COMMIT')
+                    writes.append(time.perf_counter() - started)
+                except sqlite3.OperationalError:
+                    write_errors[0] += 1
+                    if db.in_transaction:
+                        db.execute('ROLLBACK')
+            db.close()
+
+        def reader(seed):
+            db = read_dbs[seed]
+            rnd = random.Random(seed)
+            while not stop.is_set():
+                if rnd.random() < 0.5:
+                    queryset = Booking.objects.filter(
+                        user_id=rnd.randint(1, USERS)
+                    ).order_by('-visit_datetime').values_list('pk')[:10]
+                else:
+                    start = now + timedelta(days=rnd.randint(0, 30))
+                    queryset = overlapping(
+                        rnd.randint(1, MASTERS), start,
+                        start + timedelta(days=1)
+                    ).values_list('visit_datetime', 'end_datetime', 'pk')
+                sql, params = self.compile(queryset)
+                started = time.perf_counter()
+                try:
+                    db.execute(sql, params).fetchall()
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        reads.append(elapsed)
+                except sqlite3.OperationalError:
+                    with lock:
+                        read_errors[0] += 1
+            db.close()
+
+        threads = [threading.Thread(target=writer)] + [
+            threading.Thread(target=reader, args=(seed,))
+            for seed in range(options['readers'])
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['seconds'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        seconds = options['seconds']
+        reads.sort()
+        self.stdout.write(
+            f'  запись: {len(writes) / seconds:.0f} транзакций/с, '
+            f'ошибок блокировки: {write_errors[0]}\n'
+            f'  чтение: {len(reads) / seconds:.0f} запросов/с, '
+            f'медиана {statistics.median(reads) * 1000:.3f} мс, '
+            f'p99 {reads[int(len(reads) * 0.99) - 1] * 1000:.3f} мс, '
+            f'ошибок блокировки: {read_errors[0]}'
+            if reads else
+            f'  чтение: ни одного успешного запроса, '
+            f'ошибок блокировки: {read_errors[0]}'
+        )
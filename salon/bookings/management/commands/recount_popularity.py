@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from bookings.popularity import recount
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики популярности мастеров и услуг '
+        '(всего и за последние 30 дней).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', type=int, metavar='SECONDS',
+            help='Не завершаться, а повторять пересчёт с этим интервалом.'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            recount()
+            self.stdout.write(
+                f'Счётчики пересчитаны за '
+                f'{time.perf_counter() - started:.2f} с'
+            )
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
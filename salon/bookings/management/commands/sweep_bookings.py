@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from bookings.sweeper import BATCH_SIZE, sweep
+
+
+class Command(BaseCommand):
+    help = (
+        'Отменяет прошедшие неподтверждённые записи и завершает '
+        'прошедшие подтверждённые.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Сколько записей обновлять за один UPDATE.'
+        )
+        parser.add_argument(
+            '--loop', type=int, metavar='SECONDS',
+            help='Не завершаться, а повторять уборку с этим интервалом.'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            run = sweep(batch_size=options['batch_size'])
+            self.stdout.write(
+                f'Отменено: {run.expired}, завершено: {run.completed}, '
+                f'пачек: {run.batches}'
+            )
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.16 on 2026-10-18 05:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0003_alter_bookingservice_service'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='duration_minutes',
+            field=models.PositiveSmallIntegerField(default=60, editable=False, verbose_name='Длительность (мин)'),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='end_datetime',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Окончание визита'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+"""Заполняет duration_minutes и end_datetime у существующих записей.
+
+Миграция не атомарная: записи обрабатываются пачками по BATCH_SIZE,
+каждая пачка — в своей короткой транзакции, чтобы не держать
+блокировку таблицы на всё время заполнения.
+"""
+from datetime import timedelta
+
+from django.db import migrations, transaction
+
+BATCH_SIZE = 2000
+DEFAULT_DURATION = 60
+
+
+def backfill_end_datetime(apps, schema_editor):
+    Booking = apps.get_model('bookings', 'Booking')
+    BookingService = apps.get_model('bookings', 'BookingService')
+    MasterService = apps.get_model('staff', 'MasterService')
+
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                Booking.objects.filter(
+                    pk__gt=last_pk, end_datetime__isnull=True
+                ).order_by('pk').only('pk', 'master_id', 'visit_datetime')[
+                    :BATCH_SIZE
+                ]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            services = {}
+            for booking_id, service_id in BookingService.objects.filter(
+                booking_id__in=[b.pk for b in batch]
+            ).values_list('booking_id', 'service_id'):
+                services.setdefault(booking_id, []).append(service_id)
+
+            durations = dict(
+                ((master_id, service_id), minutes)
+                for master_id, service_id, minutes in
+                MasterService.objects.filter(
+                    master_id__in={b.master_id for b in batch}
+                ).values_list('master_id', 'service_id', 'duration_minutes')
+            )
+
+            for booking in batch:
+                booking.duration_minutes = sum(
+                    durations.get((booking.master_id, service_id), 0)
+                    for service_id in services.get(booking.pk, ())
+                ) or DEFAULT_DURATION
+                booking.end_datetime = booking.visit_datetime + timedelta(
+                    minutes=booking.duration_minutes
+                )
+            Booking.objects.bulk_update(
+                batch, ['duration_minutes', 'end_datetime']
+            )
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('bookings', '0004_booking_duration_end_datetime'),
+        ('staff', '0002_alter_masterservice_master_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            backfill_end_datetime, migrations.RunPython.noop
+        ),
+    ]
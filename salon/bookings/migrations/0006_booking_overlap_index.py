@@ -0,0 +1,17 @@
+# Generated by Django 4.2.16 on 2026-10-18 05:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0005_backfill_booking_end_datetime'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['master', 'status', 'visit_datetime', 'end_datetime'], name='bookings_bo_master__447b09_idx'),
+        ),
+    ]
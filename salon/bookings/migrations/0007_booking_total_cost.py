@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 05:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0006_booking_overlap_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='total_cost',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='Стоимость'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+"""Заполняет total_cost у существующих записей пачками.
+
+Как и 0005, миграция не атомарная: каждая пачка из BATCH_SIZE записей
+обновляется в своей короткой транзакции.
+"""
+from django.db import migrations, transaction
+from django.db.models import Sum
+
+BATCH_SIZE = 2000
+
+
+def backfill_total_cost(apps, schema_editor):
+    Booking = apps.get_model('bookings', 'Booking')
+    BookingService = apps.get_model('bookings', 'BookingService')
+
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            pks = list(
+                Booking.objects.filter(pk__gt=last_pk).order_by(
+                    'pk'
+                ).values_list('pk', flat=True)[:BATCH_SIZE]
+            )
+            if not pks:
+                break
+            last_pk = pks[-1]
+
+            totals = BookingService.objects.filter(
+                booking_id__in=pks
+            ).values('booking_id').annotate(
+                total=Sum('price_at_booking')
+            ).values_list('booking_id', 'total')
+            Booking.objects.bulk_update(
+                [Booking(pk=pk, total_cost=total) for pk, total in totals],
+                ['total_cost']
+            )
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('bookings', '0007_booking_total_cost'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            backfill_total_cost, migrations.RunPython.noop
+        ),
+    ]
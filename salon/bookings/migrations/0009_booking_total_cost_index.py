@@ -0,0 +1,17 @@
+# Generated by Django 4.2.16 on 2026-10-18 05:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0008_backfill_booking_total_cost'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['total_cost'], name='bookings_bo_total_c_cfe193_idx'),
+        ),
+    ]
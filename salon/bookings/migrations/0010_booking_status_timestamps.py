@@ -0,0 +1,28 @@
+# Generated by Django 4.2.16 on 2026-10-18 05:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0009_booking_total_cost_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='cancelled_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Отменена в'),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Завершена в'),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='confirmed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Подтверждена в'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.16 on 2026-10-18 05:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0010_booking_status_timestamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SweepRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(verbose_name='Начало')),
+                ('finished_at', models.DateTimeField(verbose_name='Окончание')),
+                ('expired', models.PositiveIntegerField(default=0, verbose_name='Отменено неподтверждённых')),
+                ('completed', models.PositiveIntegerField(default=0, verbose_name='Завершено')),
+                ('batches', models.PositiveIntegerField(default=0, verbose_name='Пачек')),
+            ],
+            options={
+                'verbose_name': 'уборка записей',
+                'verbose_name_plural': 'Уборка записей',
+                'ordering': ('-started_at',),
+            },
+        ),
+    ]
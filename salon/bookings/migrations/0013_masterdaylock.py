@@ -0,0 +1,28 @@
+# Generated by Django 4.2.16 on 2026-10-18 06:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('staff', '0002_alter_masterservice_master_and_more'),
+        ('bookings', '0012_active_booking_partial_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MasterDayLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('master', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='staff.master', verbose_name='Мастер')),
+            ],
+            options={
+                'verbose_name': 'блокировка дня мастера',
+                'verbose_name_plural': 'Блокировки дней мастеров',
+                'unique_together': {('master', 'day')},
+            },
+        ),
+    ]
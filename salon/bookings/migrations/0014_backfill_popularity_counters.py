@@ -0,0 +1,56 @@
+"""Заполняет счётчики популярности мастеров и услуг.
+
+Тот же пересчёт, что и bookings.popularity.recount(), на исторических
+моделях: по одному UPDATE с подзапросом на таблицу.
+"""
+from datetime import timedelta
+
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+POPULARITY_WINDOW_DAYS = 30
+
+
+def _count_subquery(queryset, group_field):
+    return Coalesce(Subquery(
+        queryset.filter(**{group_field: OuterRef('pk')}).values(
+            group_field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def backfill_counters(apps, schema_editor):
+    Booking = apps.get_model('bookings', 'Booking')
+    BookingService = apps.get_model('bookings', 'BookingService')
+    Master = apps.get_model('staff', 'Master')
+    Service = apps.get_model('staff', 'Service')
+
+    since = timezone.now() - timedelta(days=POPULARITY_WINDOW_DAYS)
+    bookings = Booking.objects.exclude(status='cancelled')
+    lines = BookingService.objects.exclude(booking__status='cancelled')
+    Master.objects.update(
+        booking_count=_count_subquery(bookings, 'master'),
+        recent_booking_count=_count_subquery(
+            bookings.filter(created_at__gte=since), 'master'
+        ),
+    )
+    Service.objects.update(
+        booking_count=_count_subquery(lines, 'service'),
+        recent_booking_count=_count_subquery(
+            lines.filter(booking__created_at__gte=since), 'service'
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0013_masterdaylock'),
+        ('staff', '0003_popularity_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -3,11 +3,34 @@ from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
-from staff.models import Master, Service
+from django.db.models import Sum
+from staff.models import Master, MasterService, Service
 
 
 User = get_user_model()
 
+# Длительность записи без услуг, мин
+DEFAULT_DURATION = 60
+# Статусы записи, которые занимают время мастера
+ACTIVE_STATUSES = ('pending', 'confirmed')
+
+
+class ActiveStatus(models.Lookup):
+    """status__active=True — статус из ACTIVE_STATUSES.
+
+    Значения подставляются в SQL литералами: SQLite применяет частичный
+    индекс, только если условие запроса буквально совпадает с условием
+    индекса, а с параметрами (?) совпадения нет.
+    """
+    lookup_name = 'active'
+    prepare_rhs = False
+
+    def as_sql(self, compiler, connection):
+        lhs, params = self.process_lhs(compiler, connection)
+        values = ', '.join(f"'{status}'" for status in ACTIVE_STATUSES)
+        operator = 'IN' if self.rhs else 'NOT IN'
+        return f'{lhs} {operator} ({values})', params
+
 
 class ClientPreference(models.Model):
     """Предпочтения клиента по мастерам (необязательно, но масштабируемо)"""
@@ -38,6 +61,7 @@ class Booking(models.Model):
         ('cancelled', 'Отменена'),
         ('completed', 'Завершена'),
     ]
+    ACTIVE_STATUSES = ACTIVE_STATUSES
 
     user = models.ForeignKey(
         User,
@@ -54,12 +78,51 @@ class Booking(models.Model):
     visit_datetime = models.DateTimeField(
         verbose_name='Дата и время визита'
     )
+    # Денормализация: сумма MasterService.duration_minutes услуг записи,
+    # пересчитывается при изменении BookingService (см. signals.py)
+    duration_minutes = models.PositiveSmallIntegerField(
+        default=DEFAULT_DURATION,
+        editable=False,
+        verbose_name='Длительность (мин)'
+    )
+    end_datetime = models.DateTimeField(
+        null=True,
+        editable=False,
+        verbose_name='Окончание визита'
+    )
+    # Денормализация: сумма BookingService.price_at_booking
+    total_cost = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        editable=False,
+        verbose_name='Стоимость'
+    )
     status = models.CharField(
         max_length=20,
         choices=STATUS_CHOICES,
         default='pending',
         verbose_name='Статус'
     )
+    # Моменты переходов статуса (см. transitions.py)
+    confirmed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Подтверждена в'
+    )
+    cancelled_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Отменена в'
+    )
+    completed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Завершена в'
+    )
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Создана'
@@ -76,56 +139,180 @@ class Booking(models.Model):
         indexes = [
             models.Index(fields=['user', 'status']),
             models.Index(fields=['master', 'visit_datetime']),
+            # Проверка пересечения (start < end и end > start) идёт только
+            # по активным записям — отменённые и завершённые, а это
+            # большая часть таблицы, в частичный индекс не попадают
+            models.Index(
+                fields=['master', 'visit_datetime', 'end_datetime'],
+                condition=models.Q(status__in=ACTIVE_STATUSES),
+                name='booking_active_master_idx'
+            ),
+            # «Мои записи»: записи клиента от новых к старым
+            models.Index(
+                fields=['user', '-visit_datetime'],
+                name='booking_user_visit_idx'
+            ),
+            models.Index(fields=['total_cost']),
         ]
 
     def __str__(self):
         return f'{self.user} → {self.master} ({self.visit_datetime:%d.%m.%Y %H:%M})'
 
-    @property
-    def total_cost(self):
-        return sum(bs.price_at_booking for bs in self.booking_services.all())
+    def calculate_duration(self):
+        """Сумма индивидуальных длительностей услуг записи у мастера."""
+        total = MasterService.objects.filter(
+            master_id=self.master_id,
+            service__booking_services__booking=self
+        ).aggregate(total=Sum('duration_minutes'))['total']
+        return total or DEFAULT_DURATION
+
+    def set_duration(self, duration):
+        self.duration_minutes = duration
+        self.end_datetime = self.visit_datetime + timezone.timedelta(
+            minutes=duration
+        )
+
+    def calculate_total_cost(self):
+        return self.booking_services.aggregate(
+            total=Sum('price_at_booking')
+        )['total'] or 0
+
+    def update_totals(self):
+        """Пересчитывает длительность и стоимость без полной валидации."""
+        self.set_duration(self.calculate_duration())
+        self.total_cost = self.calculate_total_cost()
+        Booking.objects.filter(pk=self.pk).update(
+            duration_minutes=self.duration_minutes,
+            end_datetime=self.end_datetime,
+            total_cost=self.total_cost
+        )
+
+    def transition_to(self, status):
+        """Переводит запись в статус, если переход допустим."""
+        from .transitions import TRANSITIONS, apply_transition
+        now = timezone.now()
+        result = apply_transition(
+            Booking.objects.filter(pk=self.pk), status,
+            now=now, count_rejected=False
+        )
+        if not result.applied:
+            return False
+        self.status = self._initial_status = status
+        setattr(self, TRANSITIONS[status].timestamp_field, now)
+        self.updated_at = now
+        return True
+
+    def status_changed(self):
+        initial = getattr(self, '_initial_status', None)
+        return (
+            self.pk is not None and initial is not None
+            and self.status != initial
+        )
 
     def cancel(self):
-        self.status = 'cancelled'
-        self.save(update_fields=['status', 'updated_at'])
+        return self.transition_to('cancelled')
 
     # === ВАЛИДАЦИЯ ===
     def clean(self):
         super().clean()
+        errors = {}
 
         if not self.master.is_published:
-            self.add_error('master', 'Этот мастер временно недоступен.')
+            errors['master'] = 'Этот мастер временно недоступен.'
 
-        if self.visit_datetime and self.visit_datetime < timezone.now():
-            self.add_error('visit_datetime', 'Нельзя записаться на прошедшее время.')
+        if self.status == 'completed':
+            if self.visit_datetime and self.visit_datetime > timezone.now():
+                errors['status'] = 'Завершить можно только прошедший визит.'
+        elif self.visit_datetime and self.visit_datetime < timezone.now():
+            errors['visit_datetime'] = 'Нельзя записаться на прошедшее время.'
 
-        if self.pk is None:
-            return
-
-        if self.visit_datetime and self.master_id:
-            duration = sum(
-                ms.duration_minutes 
-                for ms in self.master.offered_services.filter(
-                    service__in=self.booking_services.values_list('service_id', flat=True)
+        if self.status_changed():
+            # Смена статуса — только по допустимому переходу (TRANSITIONS)
+            from .transitions import TRANSITIONS
+            transition = TRANSITIONS.get(self.status)
+            if (
+                transition is None
+                or self._initial_status not in transition.sources
+            ):
+                labels = dict(self.STATUS_CHOICES)
+                errors['status'] = (
+                    f'Нельзя перевести запись из статуса '
+                    f'«{labels[self._initial_status]}» '
+                    f'в «{labels[self.status]}».'
                 )
-            ) or 60
-
-            start = self.visit_datetime
-            end = start + timezone.timedelta(minutes=duration)
 
-            overlapping = Booking.objects.filter(
-                master=self.master,
-                status__in=['pending', 'confirmed'],
-                visit_datetime__lt=end,
-                visit_datetime__gt=start - timezone.timedelta(minutes=duration)
-            ).exclude(pk=self.pk)  # исключаем текущую запись
+        if (
+            self.pk is not None
+            and self.status in self.ACTIVE_STATUSES
+            and self.visit_datetime and self.end_datetime
+            and 'visit_datetime' not in errors
+        ):
+            from .availability import overlapping
+            # Прямо по базе, не по кэшу расписаний: кэш может быть
+            # локальным для процесса и не видеть чужие записи.
+            # Исключаем текущую запись
+            if overlapping(
+                self.master_id, self.visit_datetime, self.end_datetime
+            ).exclude(pk=self.pk).exists():
+                errors['visit_datetime'] = (
+                    'У мастера уже есть запись в это время. '
+                    'Выберите другое время.'
+                )
 
-            if overlapping.exists():
-                self.add_error('visit_datetime', 'У мастера уже есть запись в это время. Выберите другое время.')
+        if errors:
+            raise ValidationError(errors)
 
     def save(self, *args, **kwargs):
+        if self.visit_datetime:
+            initial_master_id = getattr(self, '_initial_slot', (None,))[0]
+            if (
+                self.pk and not kwargs.get('update_fields')
+                and self.master_id != initial_master_id
+            ):
+                # Сменился мастер — у него другие длительности. Иначе
+                # длительность не пересчитываем: правка каталога не должна
+                # менять время прошлых записей (состав услуг пересчитывает
+                # update_totals)
+                self.set_duration(self.calculate_duration())
+            else:
+                self.set_duration(self.duration_minutes)
         self.full_clean()
+        if self.status_changed():
+            # Та же отметка времени перехода, что ставит apply_transition
+            from .transitions import TRANSITIONS
+            setattr(
+                self, TRANSITIONS[self.status].timestamp_field,
+                timezone.now()
+            )
         super().save(*args, **kwargs)
+        self._initial_status = self.status
+
+
+Booking._meta.get_field('status').register_lookup(ActiveStatus)
+
+
+class MasterDayLock(models.Model):
+    """Строка-блокировка «мастер — день».
+
+    Создание записи блокирует строки дней, которые она задевает, поэтому
+    параллельные записи к одному мастеру на один день идут по очереди
+    (см. services.lock_master_days).
+    """
+    master = models.ForeignKey(
+        Master,
+        on_delete=models.CASCADE,
+        verbose_name='Мастер',
+        related_name='+'
+    )
+    day = models.DateField(verbose_name='День')
+
+    class Meta:
+        verbose_name = 'блокировка дня мастера'
+        verbose_name_plural = 'Блокировки дней мастеров'
+        unique_together = ('master', 'day')
+
+    def __str__(self):
+        return f'{self.master_id}: {self.day}'
 
 
 class BookingService(models.Model):
@@ -170,3 +357,29 @@ class BookingService(models.Model):
     def save(self, *args, **kwargs):
 
         super().save(*args, **kwargs)
+
+
+class SweepRun(models.Model):
+    """Журнал уборки устаревших записей (см. sweeper.py)"""
+    started_at = models.DateTimeField(verbose_name='Начало')
+    finished_at = models.DateTimeField(verbose_name='Окончание')
+    expired = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Отменено неподтверждённых'
+    )
+    completed = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Завершено'
+    )
+    batches = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Пачек'
+    )
+
+    class Meta:
+        verbose_name = 'уборка записей'
+        verbose_name_plural = 'Уборка записей'
+        ordering = ('-started_at',)
+
+    def __str__(self):
+        return f'Уборка {self.started_at:%d.%m.%Y %H:%M}'
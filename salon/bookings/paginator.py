@@ -0,0 +1,56 @@
+"""Пагинатор с оценочным числом строк для больших таблиц.
+
+COUNT(*) по всей таблице записей — самый медленный запрос админки.
+Для запросов без фильтров берём оценку из статистики СУБД
+(pg_class.reltuples в PostgreSQL, sqlite_stat1 после ANALYZE в SQLite).
+Включается настройкой BOOKINGS_ADMIN_ESTIMATED_COUNT.
+"""
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+
+# Ниже этого порога оценке не доверяем и считаем точно
+ESTIMATE_THRESHOLD = 10000
+
+
+def estimate_row_count(model, using='default'):
+    """Оценка числа строк таблицы по статистике СУБД или None."""
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s'
+    elif connection.vendor == 'sqlite':
+        # Первое число в stat — количество строк индекса; у частичных
+        # индексов оно меньше, поэтому берём максимум по всем индексам
+        sql = (
+            'SELECT MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 '
+            'WHERE tbl = %s'
+        )
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if not row or row[0] is None:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if (
+            getattr(settings, 'BOOKINGS_ADMIN_ESTIMATED_COUNT', False)
+            and hasattr(queryset, 'query')
+            and not queryset.query.where
+        ):
+            estimate = estimate_row_count(queryset.model, queryset.db)
+            if estimate and estimate >= ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
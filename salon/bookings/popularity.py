@@ -0,0 +1,150 @@
+"""Счётчики популярности мастеров и услуг.
+
+Master.booking_count и Service.booking_count — число неотменённых
+записей (для услуги — строк BookingService в таких записях),
+recent_booking_count — то же за последние POPULARITY_WINDOW_DAYS дней
+по дате создания записи. Счётчики меняются атомарно через F() при
+создании и отмене записи, а recount() (manage.py recount_popularity)
+периодически пересчитывает их по таблице записей: исправляет
+расхождения и сдвигает окно «последних 30 дней».
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.dispatch import Signal
+from django.utils import timezone
+
+from staff.models import Master, Service
+from .models import Booking, BookingService
+
+POPULARITY_WINDOW_DAYS = 30
+
+# Счётчики изменились; masters и services — {pk: (delta, recent_delta)}
+popularity_changed = Signal()
+# Счётчики пересчитаны целиком
+popularity_recounted = Signal()
+
+
+def window_start(now=None):
+    return (now or timezone.now()) - timedelta(days=POPULARITY_WINDOW_DAYS)
+
+
+def _counter(field, delta):
+    value = F(field) + delta
+    if delta < 0:
+        # Не уходим ниже нуля, если счётчик уже разошёлся с данными
+        value = Greatest(value, Value(0))
+    return value
+
+
+def _apply(model, deltas):
+    # Одинаковые приращения — одним UPDATE
+    groups = defaultdict(list)
+    for pk, pair in deltas.items():
+        if pair != (0, 0):
+            groups[pair].append(pk)
+    for (delta, recent_delta), pks in groups.items():
+        model.objects.filter(pk__in=pks).update(
+            booking_count=_counter('booking_count', delta),
+            recent_booking_count=_counter(
+                'recent_booking_count', recent_delta
+            ),
+        )
+
+
+def change_counts(masters=None, services=None):
+    """Применяет приращения {pk: (delta, recent_delta)} к счётчикам."""
+    masters = masters or {}
+    services = services or {}
+    _apply(Master, masters)
+    _apply(Service, services)
+    if masters or services:
+        popularity_changed.send(
+            sender=Booking, masters=masters, services=services
+        )
+
+
+def count_new_booking(master_id, service_ids):
+    change_counts(
+        {master_id: (1, 1)},
+        {service_id: (1, 1) for service_id in service_ids},
+    )
+
+
+def count_booking_change(booking, delta):
+    """±1 мастеру за одну запись (записи, изменённые в админке)."""
+    if booking.status == 'cancelled':
+        return
+    change_counts(masters={
+        booking.master_id: _pair(booking.created_at, delta)
+    })
+
+
+def count_booking_service_change(line, delta):
+    """±1 услуге за строку BookingService (записи, изменённые в админке)."""
+    booking = Booking.objects.filter(pk=line.booking_id).values_list(
+        'status', 'created_at'
+    ).first()
+    if booking is None or booking[0] == 'cancelled':
+        return
+    change_counts(services={line.service_id: _pair(booking[1], delta)})
+
+
+def _pair(created_at, delta):
+    recent = created_at is None or created_at >= window_start()
+    return (delta, delta if recent else 0)
+
+
+def uncount_bookings(bookings, now=None):
+    """Вычитает записи queryset bookings из счётчиков (при отмене).
+
+    Два запроса с группировкой независимо от числа записей.
+    """
+    since = window_start(now)
+    masters = {
+        row['master_id']: (-row['total'], -row['recent'])
+        for row in bookings.values('master_id').annotate(
+            total=Count('pk'),
+            recent=Count('pk', filter=Q(created_at__gte=since)),
+        ).order_by()
+    }
+    services = {
+        row['service_id']: (-row['total'], -row['recent'])
+        for row in BookingService.objects.filter(
+            booking__in=bookings.values('pk')
+        ).values('service_id').annotate(
+            total=Count('pk'),
+            recent=Count('pk', filter=Q(booking__created_at__gte=since)),
+        ).order_by()
+    }
+    change_counts(masters, services)
+
+
+def _count_subquery(queryset, group_field):
+    return Coalesce(Subquery(
+        queryset.filter(**{group_field: OuterRef('pk')}).values(
+            group_field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def recount(now=None):
+    """Пересчитывает все счётчики по таблице записей."""
+    since = window_start(now)
+    bookings = Booking.objects.exclude(status='cancelled')
+    lines = BookingService.objects.exclude(booking__status='cancelled')
+    Master.objects.update(
+        booking_count=_count_subquery(bookings, 'master'),
+        recent_booking_count=_count_subquery(
+            bookings.filter(created_at__gte=since), 'master'
+        ),
+    )
+    Service.objects.update(
+        booking_count=_count_subquery(lines, 'service'),
+        recent_booking_count=_count_subquery(
+            lines.filter(booking__created_at__gte=since), 'service'
+        ),
+    )
+    popularity_recounted.send(sender=Booking)
@@ -0,0 +1,115 @@
+"""Повтор транзакций записи при конфликте блокировок.
+
+Под нагрузкой транзакция создания записи может упасть не из-за данных,
+а из-за конкуренции: SQLite отвечает «database is locked», PostgreSQL —
+ошибкой сериализации, взаимной блокировкой или таймаутом блокировки.
+Такие ошибки повторяются с экспоненциальной задержкой и случайным
+разбросом (jitter), число попыток ограничено. Ошибки проверки
+(ValidationError) не повторяются и возвращаются сразу.
+
+Счётчики попыток и конфликтов — retry_stats().
+"""
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, connection
+
+logger = logging.getLogger(__name__)
+
+ATTEMPTS = 5
+BACKOFF = 0.05
+MAX_BACKOFF = 1.0
+
+# SQLSTATE PostgreSQL: serialization_failure, deadlock_detected,
+# lock_not_available
+RETRY_SQLSTATES = {'40001', '40P01', '55P03'}
+SQLITE_LOCK_MESSAGES = ('database is locked', 'database table is locked')
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _count(**increments):
+    with _stats_lock:
+        _stats.update(increments)
+
+
+def retry_stats():
+    """Снимок счётчиков: attempts, conflicts, retries, exhausted."""
+    with _stats_lock:
+        return {
+            key: _stats[key]
+            for key in ('attempts', 'conflicts', 'retries', 'exhausted')
+        }
+
+
+def reset_retry_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def is_lock_conflict(exc):
+    """Ошибка вызвана конкуренцией за блокировку, а не данными."""
+    if not isinstance(exc, OperationalError):
+        return False
+    cause = exc.__cause__
+    sqlstate = (
+        getattr(cause, 'sqlstate', None) or getattr(cause, 'pgcode', None)
+    )
+    if sqlstate in RETRY_SQLSTATES:
+        return True
+    message = str(exc).lower()
+    return any(text in message for text in SQLITE_LOCK_MESSAGES)
+
+
+def backoff_delay(attempt, base=None, cap=None):
+    """Задержка перед попыткой attempt (с 1).
+
+    «Full jitter»: случайное значение от 0 до base·2^attempt, не больше cap.
+    """
+    base = BACKOFF if base is None else base
+    cap = MAX_BACKOFF if cap is None else cap
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def retry_on_conflict(func=None, *, attempts=None):
+    """Декоратор: повторяет func при конфликте блокировок.
+
+    Повторять можно только целую транзакцию, поэтому внутри чужого
+    atomic() (например, ATOMIC_REQUESTS) ошибка пробрасывается сразу.
+    После исчерпания попыток пробрасывается последняя ошибка.
+    """
+    if func is None:
+        return lambda f: retry_on_conflict(f, attempts=attempts)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        limit = attempts or getattr(
+            settings, 'BOOKINGS_RETRY_ATTEMPTS', ATTEMPTS
+        )
+        attempt = 1
+        while True:
+            _count(attempts=1)
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as e:
+                if not is_lock_conflict(e):
+                    raise
+                _count(conflicts=1)
+                if attempt >= limit or connection.in_atomic_block:
+                    _count(exhausted=1)
+                    logger.warning(
+                        'Конфликт блокировок в %s: попыток %s, сдаёмся',
+                        func.__name__, attempt
+                    )
+                    raise
+            _count(retries=1)
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
+
+    return wrapper
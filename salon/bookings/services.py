@@ -0,0 +1,127 @@
+"""Создание записей клиентов.
+
+Проверки выполняются один раз по уже загруженным данным, а запись
+и все её услуги вставляются через bulk_create — число запросов
+не зависит от количества выбранных услуг.
+
+Проверка «время свободно» и вставка идут под блокировкой дней мастера
+(MasterDayLock), поэтому две параллельные записи на одно время не
+пройдут обе. При конфликте блокировок (SQLite «database is locked»,
+ошибки сериализации PostgreSQL) создание повторяется — см. retry.py.
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from staff.models import MasterService
+from . import availability, popularity
+from .models import Booking, BookingService, MasterDayLock
+from .retry import retry_on_conflict
+
+SLOT_TAKEN_MESSAGE = (
+    'Выбранное время занято. Попробуйте другое время или другого мастера.'
+)
+
+
+def get_durations(master, services):
+    """{service_id: duration_minutes} для услуг мастера одним запросом."""
+    return dict(
+        MasterService.objects.filter(
+            master=master, service__in=services
+        ).values_list('service_id', 'duration_minutes')
+    )
+
+
+def validate_booking(master, services, when, durations, exclude_pk=None):
+    """Проверяет запись и возвращает её длительность в минутах."""
+    if not master.is_published:
+        raise ValidationError('Выбранный мастер временно недоступен.')
+    if when < timezone.now():
+        raise ValidationError('Нельзя записаться на прошедшее время.')
+
+    invalid_services = [s.title for s in services if s.pk not in durations]
+    if invalid_services:
+        raise ValidationError(
+            f'Мастер не оказывает услуги: {", ".join(invalid_services)}.'
+        )
+
+    duration = sum(durations[s.pk] for s in services)
+    end = when + timezone.timedelta(minutes=duration)
+    if not availability.is_slot_free(master.pk, when, end, exclude_pk):
+        raise ValidationError(SLOT_TAKEN_MESSAGE)
+    return duration
+
+
+def lock_master_days(master_id, start, end):
+    """Блокирует дни мастера из [start, end) до конца транзакции.
+
+    Первая инструкция транзакции — запись (INSERT ... ON CONFLICT DO
+    NOTHING / INSERT OR IGNORE): в SQLite она сразу берёт блокировку
+    записи, как BEGIN IMMEDIATE, и остальные пишущие ждут busy timeout.
+    В PostgreSQL строки дней затем блокируются SELECT ... FOR UPDATE.
+    Дни блокируются по порядку, чтобы не было взаимных блокировок.
+    """
+    days = availability.days_between(start, end)
+    MasterDayLock.objects.bulk_create(
+        [MasterDayLock(master_id=master_id, day=day) for day in days],
+        ignore_conflicts=True
+    )
+    list(
+        MasterDayLock.objects.select_for_update().filter(
+            master_id=master_id, day__in=days
+        ).order_by('day')
+    )
+
+
+@retry_on_conflict
+def create_booking(user, master, services, when, durations=None,
+                   duration=None):
+    """Создаёт запись со статусом «Ожидает подтверждения».
+
+    durations — готовая карта длительностей услуг мастера
+    (например, из BookingForm), чтобы не запрашивать её повторно.
+    duration — длительность уже проверенной записи (BookingForm.clean
+    вызывал validate_booking): повторная проверка пропускается, занятость
+    времени всё равно перепроверяется под блокировкой.
+    Ошибки проверки выбрасываются сразу, конфликты блокировок
+    повторяются с задержкой.
+    """
+    services = list(services)
+    if duration is None:
+        if durations is None:
+            durations = get_durations(master, services)
+        duration = validate_booking(master, services, when, durations)
+
+    booking = Booking(
+        user=user,
+        master=master,
+        visit_datetime=when,
+        status='pending'
+    )
+    booking.set_duration(duration)
+    booking.total_cost = sum(service.price for service in services)
+
+    with transaction.atomic():
+        lock_master_days(master.pk, when, booking.end_datetime)
+        # Под блокировкой перепроверяем по БД: кэш мог устареть
+        if availability.overlapping(
+            master.pk, when, booking.end_datetime
+        ).exists():
+            raise ValidationError(SLOT_TAKEN_MESSAGE)
+        # bulk_create обходит Booking.save() с повторным full_clean()
+        Booking.objects.bulk_create([booking])
+        BookingService.objects.bulk_create([
+            BookingService(
+                booking=booking,
+                service=service,
+                price_at_booking=service.price
+            )
+            for service in services
+        ])
+        popularity.count_new_booking(
+            master.pk, [service.pk for service in services]
+        )
+
+    # bulk_create не отправляет post_save — сбрасываем кэш расписания сами
+    availability.invalidate(master.pk, when)
+    return booking
@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import availability, popularity
+from .models import Booking, BookingService
+from .transitions import TRANSITIONS
+
+
+@receiver(post_init, sender=Booking)
+def remember_slot(sender, instance, **kwargs):
+    """Запоминаем исходные мастера и время, чтобы сбросить старый день,
+    и статус — чтобы Booking.clean проверил переход."""
+    instance._initial_slot = (instance.master_id, instance.visit_datetime)
+    # Из __dict__: отложенное поле не подгружаем отдельным запросом
+    instance._initial_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def invalidate_booking_schedule(sender, instance, **kwargs):
+    master_id, visit_datetime = getattr(
+        instance, '_initial_slot', (None, None)
+    )
+    if master_id and visit_datetime:
+        availability.invalidate(master_id, visit_datetime)
+    if instance.visit_datetime:
+        availability.invalidate(instance.master_id, instance.visit_datetime)
+    instance._initial_slot = (instance.master_id, instance.visit_datetime)
+
+
+@receiver(post_save, sender=BookingService)
+@receiver(post_delete, sender=BookingService)
+def update_booking_totals(sender, instance, **kwargs):
+    # Состав услуг меняет стоимость и длительность записи,
+    # а значит и занятость дня
+    booking = Booking.objects.filter(pk=instance.booking_id).first()
+    if booking:
+        booking.update_totals()
+        availability.invalidate(booking.master_id, booking.visit_datetime)
+
+
+# Счётчики популярности для записей, изменённых в админке;
+# create_booking и переходы статусов считают сами
+@receiver(post_save, sender=Booking)
+def count_created_booking(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        popularity.count_booking_change(instance, 1)
+
+
+@receiver(post_save, sender=Booking)
+def count_status_change(sender, instance, created, raw=False, **kwargs):
+    # Отмена через save() (не через apply_transition) — вычитаем запись
+    if created or raw or not instance.status_changed():
+        return
+    transition = TRANSITIONS.get(instance.status)
+    if transition and transition.uncounts:
+        popularity.uncount_bookings(Booking.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Booking)
+def count_deleted_booking(sender, instance, **kwargs):
+    popularity.count_booking_change(instance, -1)
+
+
+@receiver(post_save, sender=BookingService)
+def count_created_booking_service(sender, instance, created, raw=False,
+                                  **kwargs):
+    if created and not raw:
+        popularity.count_booking_service_change(instance, 1)
+
+
+@receiver(post_delete, sender=BookingService)
+def count_deleted_booking_service(sender, instance, **kwargs):
+    popularity.count_booking_service_change(instance, -1)
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """Настраивает каждое новое соединение SQLite (settings.SQLITE_PRAGMAS).
+
+    Соединение READ_DATABASE дополнительно получает SQLITE_READ_PRAGMAS.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = dict(getattr(settings, 'SQLITE_PRAGMAS', {}))
+    read_alias = getattr(settings, 'READ_DATABASE', DEFAULT_DB_ALIAS)
+    if connection.alias == read_alias != DEFAULT_DB_ALIAS:
+        pragmas.update(getattr(settings, 'SQLITE_READ_PRAGMAS', {}))
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,71 @@
+"""Уборка устаревших записей.
+
+Прошедшие неподтверждённые записи отменяются, прошедшие подтверждённые —
+завершаются. Обходятся только активные записи — по частичному индексу
+booking_active_master_idx, пачками по (end_datetime, pk) (keyset);
+история (отменённые и завершённые) не читается. Каждая пачка — отдельный
+короткий UPDATE, поэтому уборку можно запускать каждые несколько минут
+на большой таблице без долгих блокировок. Так активных записей
+(pending/confirmed), по которым идёт проверка пересечений,
+остаётся немного.
+
+Запускается командой manage.py sweep_bookings (по cron или с --loop) —
+в одном процессе, а не в каждом воркере.
+"""
+import logging
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Booking, SweepRun
+from .transitions import apply_transition
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+
+def _sweep_status(source, target, condition, now, batch_size):
+    applied = batches = 0
+    queryset = Booking.objects.filter(
+        condition, status__active=True, status=source
+    ).order_by('end_datetime', 'pk')
+    cursor = None
+    while True:
+        batch = queryset
+        if cursor is not None:
+            last_end, last_pk = cursor
+            batch = batch.filter(
+                Q(end_datetime__gt=last_end)
+                | Q(end_datetime=last_end, pk__gt=last_pk)
+            )
+        rows = list(batch.values_list('end_datetime', 'pk')[:batch_size])
+        if not rows:
+            return applied, batches
+        cursor = rows[-1]
+        batches += 1
+        result = apply_transition(
+            Booking.objects.filter(pk__in=[pk for _, pk in rows]), target,
+            now=now, count_rejected=False
+        )
+        applied += result.applied
+
+
+def sweep(now=None, batch_size=BATCH_SIZE):
+    """Один проход уборки; результат сохраняется в SweepRun."""
+    now = now or timezone.now()
+    run = SweepRun(started_at=timezone.now())
+    run.expired, expired_batches = _sweep_status(
+        'pending', 'cancelled', Q(visit_datetime__lt=now), now, batch_size
+    )
+    run.completed, completed_batches = _sweep_status(
+        'confirmed', 'completed', Q(end_datetime__lt=now), now, batch_size
+    )
+    run.batches = expired_batches + completed_batches
+    run.finished_at = timezone.now()
+    run.save()
+    logger.info(
+        'Уборка записей: отменено %s, завершено %s, пачек %s',
+        run.expired, run.completed, run.batches
+    )
+    return run
@@ -0,0 +1,116 @@
+"""Переходы статусов записей.
+
+Допустимые переходы описаны в TRANSITIONS. apply_transition применяет
+переход к любому набору записей одним UPDATE: условие WHERE пропускает
+только записи в допустимых исходных статусах (и, для «Завершена», с уже
+прошедшим визитом), остальные считаются отклонёнными. Отмена вычитает
+записи из счётчиков популярности (popularity.py) в той же транзакции.
+"""
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import availability, popularity
+
+Transition = namedtuple(
+    'Transition',
+    ['sources', 'timestamp_field', 'past_only', 'frees_slot', 'uncounts']
+)
+TransitionResult = namedtuple('TransitionResult', ['applied', 'rejected'])
+
+TRANSITIONS = {
+    'confirmed': Transition(
+        sources=('pending',),
+        timestamp_field='confirmed_at',
+        past_only=False,
+        frees_slot=False,
+        uncounts=False,
+    ),
+    'cancelled': Transition(
+        sources=('pending', 'confirmed'),
+        timestamp_field='cancelled_at',
+        past_only=False,
+        frees_slot=True,
+        uncounts=True,
+    ),
+    'completed': Transition(
+        sources=('confirmed',),
+        timestamp_field='completed_at',
+        past_only=True,
+        frees_slot=False,
+        uncounts=False,
+    ),
+}
+
+
+def allowed_sources(target):
+    return TRANSITIONS[target].sources
+
+
+def transition_q(target, now=None):
+    """Условие на записи, которые можно перевести в статус target."""
+    transition = TRANSITIONS[target]
+    condition = Q(status__in=transition.sources)
+    if transition.past_only:
+        condition &= Q(visit_datetime__lt=now or timezone.now())
+    return condition
+
+
+def can_transition(booking, target, now=None):
+    transition = TRANSITIONS[target]
+    if booking.status not in transition.sources:
+        return False
+    if transition.past_only:
+        return booking.visit_datetime < (now or timezone.now())
+    return True
+
+
+def apply_transition(queryset, target, now=None, count_rejected=True):
+    """Переводит записи queryset в статус target одним UPDATE.
+
+    Возвращает TransitionResult(applied, rejected). Для больших выборок
+    подсчёт отклонённых (лишний COUNT) можно отключить.
+    """
+    now = now or timezone.now()
+    transition = TRANSITIONS[target]
+    total = queryset.count() if count_rejected else None
+    allowed = queryset.filter(transition_q(target, now))
+
+    slots = []
+    if transition.frees_slot:
+        # UPDATE не отправляет сигналы — кэш расписаний сбрасываем сами
+        slots = list(
+            allowed.values_list('master_id', 'visit_datetime').distinct()
+        )
+
+    changes = {
+        'status': target,
+        transition.timestamp_field: now,
+        'updated_at': now,
+    }
+    if transition.uncounts:
+        with transaction.atomic():
+            # Ключи отбираем до UPDATE: queryset может сам фильтровать по
+            # статусу (фильтр списка в админке), и после UPDATE отменённые
+            # записи из него уже выпадут
+            pks = list(
+                allowed.select_for_update().values_list('pk', flat=True)
+            )
+            changed = queryset.model.objects.filter(pk__in=pks)
+            applied = changed.filter(transition_q(target, now)).update(
+                **changes
+            )
+            if applied:
+                # Только что отменённые записи — по отметке времени перехода
+                popularity.uncount_bookings(changed.filter(**{
+                    'status': target, transition.timestamp_field: now,
+                }), now)
+    else:
+        applied = allowed.update(**changes)
+    for master_id, visit_datetime in slots:
+        availability.invalidate(master_id, visit_datetime)
+
+    rejected = total - applied if total is not None else None
+    return TransitionResult(applied, rejected)
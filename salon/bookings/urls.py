@@ -8,4 +8,6 @@ urlpatterns = [
     path('my/', views.MyBookingsView.as_view(), name='my_bookings'),
     path('<int:pk>/cancel/', views.BookingCancelView.as_view(), name='cancel'),
     path('update-services/', views.update_services, name='update_services'),
+    path('free-slots/', views.free_slots, name='free_slots'),
+    path('earliest-slot/', views.earliest_slot, name='earliest_slot'),
 ]
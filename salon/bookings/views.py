@@ -1,4 +1,4 @@
-from django.shortcuts import get_object_or_404, redirect
+from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
@@ -7,15 +7,29 @@ from django.views.generic import (
 )
 from django.views.generic.edit import FormView
 from django import forms
-from django.db import transaction
+from django.core.exceptions import ValidationError
 from django.utils import timezone
-import traceback
+from django.utils.dateparse import parse_date
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.db.models import Prefetch
+import logging
 
 from staff.models import Master, Service, MasterService
-from .models import Booking, BookingService
+from staff.versioning import catalog_condition, request_catalog_state
+from . import availability
+from .models import Booking
 from .forms import BookingForm
+from .services import create_booking
 from django.template.loader import render_to_string
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
+
+logger = logging.getLogger(__name__)
+
+# Окно поиска ближайшего свободного времени по умолчанию, дней
+EARLIEST_SLOT_WINDOW_DAYS = 14
+
 
 class BookingCreateView(LoginRequiredMixin, FormView):
     template_name = 'bookings/booking_form.html'
@@ -28,24 +42,21 @@ class BookingCreateView(LoginRequiredMixin, FormView):
         visit_datetime = form.cleaned_data['visit_datetime']
 
         try:
-            with transaction.atomic():
-                booking = Booking(
-                    user=self.request.user,
-                    master=master,
-                    visit_datetime=visit_datetime,
-                    status='pending'
-                )
-                booking.save()
-
-                for service in services:
-                    BookingService.objects.create(
-                        booking=booking,
-                        service=service,
-                        price_at_booking=service.price
-                    )
-        except Exception as e:
-            error_msg = f"{e}\n\nTraceback:\n{''.join(traceback.format_tb(e.__traceback__))}"
-            messages.error(self.request, f'Ошибка при создании записи: {error_msg}')
+            create_booking(
+                self.request.user, master, services, visit_datetime,
+                duration=form.duration_minutes
+            )
+        except ValidationError as e:
+            form.add_error(None, e)
+            return self.form_invalid(form)
+        except DatabaseError:
+            # Конфликты блокировок create_booking уже повторил
+            logger.exception('Не удалось создать запись')
+            messages.error(
+                self.request,
+                'Не удалось создать запись: сервис перегружен. '
+                'Попробуйте ещё раз через минуту.'
+            )
             return self.form_invalid(form)
 
         messages.success(
@@ -89,28 +100,151 @@ class BookingCancelView(LoginRequiredMixin, TemplateView):
         )
         if booking.status == 'cancelled':
             messages.warning(request, 'Запись уже отменена.')
-        else:
-            booking.cancel()
+        elif booking.cancel():
             messages.success(request, f'Запись к {booking.master} отменена.')
+        else:
+            messages.warning(request, 'Эту запись уже нельзя отменить.')
         return redirect('bookings:my_bookings')
 
 
+def _services_etag(request):
+    master_id = request.GET.get('master', '')
+    if not master_id.isdigit():
+        master_id = ''
+    return f'master-{master_id}'
+
+
+@catalog_condition(etag_suffix=_services_etag)
 def update_services(request):
-    """Возвращает HTML-блок с чекбоксами услуг для выбранного мастера."""
+    """Возвращает HTML-блок с чекбоксами услуг для выбранного мастера.
+
+    Фрагмент кэшируется по мастеру и состоянию каталога из БД — тому же,
+    из которого считается ETag, поэтому процесс, не заметивший изменения
+    каталога, не отдаст старый фрагмент со свежим ETag. Браузер получает
+    304, пока каталог не изменился.
+    """
     master_id = request.GET.get('master')
     services_html = '<div class="text-muted">Сначала выберите мастера</div>'
-    
+
     if master_id:
-        try:
-            master = Master.objects.get(id=master_id, is_published=True)
-            # Получаем услуги, которые мастер оказывает
-            services = master.services.filter(is_published=True)
-            # Рендерим только поле services
-            services_html = render_to_string(
-                'bookings/partials/_services_field.html',
-                {'services': services}
+        if not master_id.isdigit():
+            return HttpResponse(
+                '<div class="text-danger">Мастер не найден</div>', status=400
+            )
+        master_id = int(master_id)
+        state = request_catalog_state(request)[1]
+        key = f'services_fragment:{master_id}:{state}'
+        services_html = cache.get(key)
+        if services_html is None:
+            services_html = _render_services_field(master_id)
+            cache.set(
+                key, services_html,
+                getattr(settings, 'PAGE_CACHE_TIMEOUT', 600)
             )
-        except Master.DoesNotExist:
-            services_html = '<div class="text-danger">Мастер не найден</div>'
 
     return HttpResponse(services_html)
+
+
+def _render_services_field(master_id):
+    try:
+        # Услуги мастера с его индивидуальным временем
+        master = Master.objects.prefetch_related(Prefetch(
+            'offered_services',
+            queryset=MasterService.objects.filter(
+                service__is_published=True
+            ).select_related('service').order_by('service__title')
+        )).get(id=master_id, is_published=True)
+    except Master.DoesNotExist:
+        return '<div class="text-danger">Мастер не найден</div>'
+    # Рендерим только поле services
+    return render_to_string(
+        'bookings/partials/_services_field.html',
+        {'offered_services': master.offered_services.all()}
+    )
+
+
+def free_slots(request):
+    """Свободные времена начала визита к мастеру на выбранный день.
+
+    Для HTMX возвращает HTML-блок с кнопками, иначе — JSON.
+    """
+    master_id = request.GET.get('master')
+    service_ids = request.GET.getlist('services')
+    try:
+        day = parse_date(request.GET.get('date') or '')
+    except ValueError:
+        day = None
+    is_htmx = request.headers.get('HX-Request') == 'true'
+
+    def error(message):
+        if is_htmx:
+            return HttpResponse(f'<div class="text-muted">{message}</div>')
+        return JsonResponse({'error': message}, status=400)
+
+    if not (master_id and service_ids and day):
+        return error('Выберите мастера, услуги и дату')
+
+    try:
+        # Длительности выбранных услуг у мастера — один запрос
+        durations = list(MasterService.objects.filter(
+            master_id=master_id,
+            master__is_published=True,
+            service_id__in=service_ids,
+            service__is_published=True,
+        ).values_list('duration_minutes', flat=True))
+    except ValueError:
+        return error('Некорректный запрос')
+    if len(durations) != len(set(service_ids)):
+        return error('Мастер не оказывает выбранные услуги')
+
+    duration = sum(durations)
+    slots = availability.free_slots(int(master_id), day, duration)
+
+    if is_htmx:
+        return render(request, 'bookings/partials/_free_slots.html', {
+            'slots': slots,
+        })
+    return JsonResponse({
+        'date': day.isoformat(),
+        'duration_minutes': duration,
+        'slots': [timezone.localtime(slot).isoformat() for slot in slots],
+    })
+
+
+def earliest_slot(request):
+    """Ближайшее свободное время у любого мастера для набора услуг (JSON)."""
+    try:
+        service_ids = [int(pk) for pk in request.GET.getlist('services')]
+        date_from = parse_date(request.GET.get('date_from') or '')
+        date_to = parse_date(request.GET.get('date_to') or '')
+    except ValueError:
+        return JsonResponse({'error': 'Некорректный запрос'}, status=400)
+    if not service_ids:
+        return JsonResponse({'error': 'Выберите услуги'}, status=400)
+
+    today = timezone.localdate()
+    date_from = date_from or today
+    date_to = date_to or date_from + timezone.timedelta(
+        days=EARLIEST_SLOT_WINDOW_DAYS - 1
+    )
+    # Окно ограничено: поиск обходит дни окна по всем мастерам
+    max_days = getattr(settings, 'BOOKINGS_EARLIEST_SLOT_MAX_DAYS', 31)
+    if date_from < today or date_to < date_from:
+        return JsonResponse({'error': 'Некорректный период'}, status=400)
+    if (date_to - date_from).days >= max_days:
+        return JsonResponse(
+            {'error': f'Период не длиннее {max_days} дней'}, status=400
+        )
+    window_start, _ = availability.day_bounds(date_from)
+    _, window_end = availability.day_bounds(date_to)
+
+    found = availability.earliest_slot(service_ids, window_start, window_end)
+    if found is None:
+        return JsonResponse({'slot': None})
+    master_id, start, duration = found
+    master = Master.objects.get(pk=master_id)
+    return JsonResponse({'slot': {
+        'master': {'id': master.pk, 'name': str(master)},
+        'start': timezone.localtime(start).isoformat(),
+        'duration_minutes': duration,
+    }})
@@ -0,0 +1,19 @@
+from django.db import transaction
+from django.dispatch import receiver
+
+from bookings.popularity import popularity_changed, popularity_recounted
+from .stats import apply_deltas, refresh
+
+
+@receiver(popularity_changed)
+def update_snapshot_counts(sender, masters, services, **kwargs):
+    # Снимок меняем только после фиксации записи: откат транзакции
+    # не должен оставить в кэше увеличенные счётчики
+    transaction.on_commit(lambda: apply_deltas(masters, services))
+
+
+@receiver(popularity_recounted)
+def refresh_snapshot(sender, **kwargs):
+    # Пересчёт идёт из команды recount_popularity: фоновый поток умер бы
+    # вместе с процессом, поэтому снимок считаем сразу
+    refresh()
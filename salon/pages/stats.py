@@ -0,0 +1,163 @@
+"""Снимок статистики главной страницы.
+
+Статистика (топ мастеров, популярные услуги, число мастеров и услуг,
+средняя цена) считается тремя запросами и хранится в кэше целиком.
+Популярность берётся из счётчиков Master/Service.booking_count и
+recent_booking_count (bookings/popularity.py): рейтинг — по записям за
+последние 30 дней, при равенстве — за всё время. В снимке лежат
+счётчики всех опубликованных мастеров и услуг, поэтому приращения
+счётчиков применяются к нему на месте (apply_deltas).
+
+Снимок устаревает по TTL (HOME_STATS_TTL) или при смене версии
+каталога. Устаревший снимок отдаётся сразу, а пересчёт идёт в фоновом
+потоке (stale-while-revalidate), так что главная страница не ждёт
+агрегатов. Синхронно снимок считается при пустом кэше и после полного
+пересчёта счётчиков (команда recount_popularity, см. signals.py).
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Avg
+
+from staff.models import Master, Service
+from staff.versioning import get_catalog_version
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KEY = 'home:stats'
+REFRESH_LOCK_KEY = 'home:stats:refreshing'
+REFRESH_LOCK_TIMEOUT = 60
+# Снимок хранится дольше TTL, чтобы было что отдать во время пересчёта
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+FEATURED_MASTERS = 3
+POPULAR_SERVICES = 4
+
+_delta_lock = threading.Lock()
+
+
+def compute_snapshot():
+    """Считает снимок статистики тремя запросами."""
+    catalog_version = get_catalog_version()
+    masters = {
+        row['id']: row for row in Master.objects.filter(
+            is_published=True
+        ).values(
+            'id', 'first_name', 'last_name',
+            'booking_count', 'recent_booking_count'
+        )
+    }
+    services = {
+        row['id']: row for row in Service.objects.filter(
+            is_published=True
+        ).values(
+            'id', 'title', 'price', 'duration_minutes',
+            'booking_count', 'recent_booking_count'
+        )
+    }
+    avg_price = Service.objects.aggregate(Avg('price'))['price__avg'] or 0
+    return {
+        'masters': masters,
+        'services': services,
+        'avg_price': avg_price,
+        'catalog_version': catalog_version,
+        'built_at': time.time(),
+    }
+
+
+def _ttl():
+    return getattr(settings, 'HOME_STATS_TTL', 300)
+
+
+def is_stale(snapshot):
+    return (
+        snapshot['catalog_version'] != get_catalog_version()
+        or time.time() - snapshot['built_at'] > _ttl()
+    )
+
+
+def refresh():
+    snapshot = compute_snapshot()
+    cache.set(SNAPSHOT_KEY, snapshot, SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def _refresh_in_background():
+    try:
+        refresh()
+    except Exception:
+        logger.exception('Ошибка пересчёта статистики главной')
+    finally:
+        cache.delete(REFRESH_LOCK_KEY)
+        close_old_connections()
+
+
+def start_refresh():
+    """Запускает пересчёт в фоне, если он ещё не идёт.
+
+    Только для запросов: поток живёт, пока жив процесс веб-сервера.
+    """
+    if not cache.add(REFRESH_LOCK_KEY, True, REFRESH_LOCK_TIMEOUT):
+        return False
+    threading.Thread(
+        target=_refresh_in_background, name='home-stats', daemon=True
+    ).start()
+    return True
+
+
+def get_snapshot():
+    snapshot = cache.get(SNAPSHOT_KEY)
+    if snapshot is None:
+        return refresh()
+    if is_stale(snapshot):
+        start_refresh()
+    return snapshot
+
+
+def apply_deltas(masters, services):
+    """Применяет к снимку приращения {pk: (delta, recent_delta)}.
+
+    Гонки между процессами могут потерять приращение — его исправит
+    ближайший пересчёт по TTL.
+    """
+    with _delta_lock:
+        snapshot = cache.get(SNAPSHOT_KEY)
+        if snapshot is None:
+            return
+        changed = False
+        for rows, deltas in (
+            (snapshot['masters'], masters),
+            (snapshot['services'], services),
+        ):
+            for pk, (delta, recent_delta) in deltas.items():
+                if pk in rows:
+                    rows[pk]['booking_count'] += delta
+                    rows[pk]['recent_booking_count'] += recent_delta
+                    changed = True
+        if changed:
+            cache.set(SNAPSHOT_KEY, snapshot, SNAPSHOT_TIMEOUT)
+
+
+def _top(rows, limit):
+    return sorted(rows, key=lambda row: (
+        -row['recent_booking_count'], -row['booking_count'], row['id']
+    ))[:limit]
+
+
+def home_context():
+    """Контекст главной страницы из снимка."""
+    snapshot = get_snapshot()
+    masters = snapshot['masters'].values()
+    services = snapshot['services'].values()
+    return {
+        'featured_masters': _top(masters, FEATURED_MASTERS),
+        'popular_services': _top(services, POPULAR_SERVICES),
+        'stats': {
+            'total_masters': len(masters),
+            'total_services': len(services),
+            'avg_price': snapshot['avg_price'],
+        },
+    }
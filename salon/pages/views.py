@@ -1,7 +1,8 @@
 from django.shortcuts import render
 from django.views.generic import TemplateView
-from staff.models import Master, Service
-from django.db.models import Avg, Count
+
+from salon.pagecache import PageCacheMixin
+from .stats import home_context
 
 
 class HomeView(TemplateView):
@@ -10,35 +11,18 @@ class HomeView(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Топ-3 мастера (по количеству записей)
-        context['featured_masters'] = Master.objects.filter(
-            is_published=True
-        ).annotate(
-            booking_count=Count('bookings')
-        ).order_by('-booking_count')[:3]
-        
-        # Популярные услуги (по количеству выборов)
-        context['popular_services'] = Service.objects.filter(
-            is_published=True
-        ).annotate(
-            booking_count=Count('booking_services')
-        ).order_by('-booking_count')[:4]
-        
-        # Статистика
-        context['stats'] = {
-            'total_masters': Master.objects.filter(is_published=True).count(),
-            'total_services': Service.objects.filter(is_published=True).count(),
-            'avg_price': Service.objects.aggregate(Avg('price'))['price__avg'] or 0,
-        }
+        # Топ-3 мастера, популярные услуги и статистика — из снимка
+        # в кэше (pages/stats.py), без агрегатов на каждый запрос
+        context.update(home_context())
         return context
 
 
-class AboutView(TemplateView):
+class AboutView(PageCacheMixin, TemplateView):
     """О салоне — переименовано из AboutTemplateView"""
     template_name = 'pages/about.html'
 
 
-class ContactsView(TemplateView):
+class ContactsView(PageCacheMixin, TemplateView):
     """Контакты — новый шаблон"""
     template_name = 'pages/contacts.html'
 
@@ -0,0 +1,81 @@
+"""Чтение каталога и записей из реплики.
+
+ReplicaRouter отправляет чтения моделей приложений из
+READ_REPLICA_APP_LABELS в алиас settings.READ_DATABASE: реплику
+(DB_REPLICA_*), а без неё для SQLite — соединение только для чтения
+к тому же файлу. Запись всегда идёт в default.
+
+Чтение возвращается в default («прилипает» к основной базе):
+- внутри транзакции default — чтобы видеть свои же изменения;
+- до конца запроса после записи;
+- в течение REPLICA_STICKY_SECONDS для клиента, который недавно писал
+  (cookie от PrimaryStickinessMiddleware) — так «Мои записи» сразу
+  показывают новую запись, даже если реплика отстаёт.
+"""
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+READ_REPLICA_APP_LABELS = {'staff', 'bookings'}
+STICKY_COOKIE = 'db_primary'
+
+# Состояние текущего запроса: {'sticky': bool, 'wrote': bool}
+_request_state = ContextVar('db_request_state', default=None)
+
+
+def read_database():
+    return getattr(settings, 'READ_DATABASE', DEFAULT_DB_ALIAS)
+
+
+def primary_pinned():
+    """Нужно ли сейчас читать из основной базы."""
+    if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return True
+    state = _request_state.get()
+    return bool(state and (state['sticky'] or state['wrote']))
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in READ_REPLICA_APP_LABELS:
+            return None
+        if primary_pinned():
+            return DEFAULT_DB_ALIAS
+        return read_database()
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # В реплике те же данные, что и в основной базе
+        aliases = {DEFAULT_DB_ALIAS, read_database()}
+        if {obj1._state.db, obj2._state.db} <= aliases:
+            return True
+        return None
+
+
+class PrimaryStickinessMiddleware:
+    """Закрепляет чтения клиента за основной базой после его записи."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = {'sticky': STICKY_COOKIE in request.COOKIES, 'wrote': False}
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        if state['wrote'] and read_database() != DEFAULT_DB_ALIAS:
+            response.set_cookie(
+                STICKY_COOKIE, '1',
+                max_age=getattr(settings, 'REPLICA_STICKY_SECONDS', 10),
+                httponly=True, samesite='Lax'
+            )
+        return response
@@ -0,0 +1,100 @@
+"""Кэш публичных страниц каталога.
+
+PageCacheMixin отдаёт анонимным посетителям страницу целиком из кэша,
+не обращаясь к базе: анонимом считается клиент без cookie сессии и
+сообщений, поэтому даже сессия не загружается. Залогиненным страница
+собирается каждый раз (в шапке имя пользователя), но блоки каталога в
+шаблонах кэшируются тегом {% cache %} с ключом из page_cache_version,
+состояния авторизации и прав (см. шаблоны staff/).
+
+Ключи включают имя вью, состояние авторизации, путь с параметрами и
+версию каталога. Сигналы staff/signals.py меняют версию при изменении
+мастеров, услуг и MasterService — старые страницы перестают читаться и
+вытесняются по PAGE_CACHE_TIMEOUT.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from staff.versioning import get_catalog_version
+
+MESSAGES_COOKIE = 'messages'
+
+
+def page_cache_key(request, auth_state, version):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    view_name = request.resolver_match.view_name
+    return f'page:{view_name}:{auth_state}:{version}:{path}'
+
+
+def is_anonymous_request(request):
+    """Аноним без сессии: ответ не зависит от пользователя."""
+    return not (
+        settings.SESSION_COOKIE_NAME in request.COOKIES
+        or MESSAGES_COOKIE in request.COOKIES
+    )
+
+
+def _cacheable(request, response):
+    # Ответ с cookie (CSRF, сессия) принадлежит одному клиенту
+    session = getattr(request, 'session', None)
+    return (
+        response.status_code == 200
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+        and not (session is not None and session.modified)
+    )
+
+
+def _conditional(request, response):
+    # Кэшированный ответ тоже отвечает 304 на If-None-Match/If-Modified-Since
+    return get_conditional_response(
+        request,
+        etag=response.get('ETag'),
+        last_modified=parse_http_date_safe(response.get('Last-Modified')),
+        response=response,
+    )
+
+
+class PageCacheMixin:
+    """Кэш всей страницы для анонимов и версия для фрагментов шаблона."""
+    page_cache_timeout = None
+
+    def get_page_cache_timeout(self):
+        if self.page_cache_timeout is not None:
+            return self.page_cache_timeout
+        return getattr(settings, 'PAGE_CACHE_TIMEOUT', 600)
+
+    def dispatch(self, request, *args, **kwargs):
+        self.page_cache_version = get_catalog_version()
+        if request.method not in ('GET', 'HEAD') or not is_anonymous_request(
+            request
+        ):
+            return super().dispatch(request, *args, **kwargs)
+
+        key = page_cache_key(request, 'anon', self.page_cache_version)
+        response = cache.get(key)
+        if response is not None:
+            return _conditional(request, response)
+
+        response = super().dispatch(request, *args, **kwargs)
+        timeout = self.get_page_cache_timeout()
+
+        def store(response):
+            if _cacheable(request, response):
+                cache.set(key, response, timeout)
+
+        if hasattr(response, 'render') and callable(response.render):
+            response.add_post_render_callback(store)
+        else:
+            store(response)
+        return response
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['page_cache_version'] = self.page_cache_version
+        context['page_cache_timeout'] = self.get_page_cache_timeout()
+        return context
@@ -1,8 +1,23 @@
+import os
+import tempfile
 from pathlib import Path
 
+from dotenv import load_dotenv
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Переменные окружения можно положить в salon/.env (см. .env.example)
+load_dotenv(BASE_DIR / ".env")
+
+
+def env_bool(name, default=False):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
 STATICFILES_DIRS = [
     BASE_DIR / "static_dev",
 ]
@@ -39,6 +54,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "salon.db.PrimaryStickinessMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -78,13 +94,123 @@ WSGI_APPLICATION = "salon.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# DB_ENGINE=postgresql — боевая база, иначе SQLite для разработки
+DB_ENGINE = os.getenv("DB_ENGINE", "sqlite")
+
+if DB_ENGINE == "postgresql":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.getenv("DB_NAME", "salon"),
+            "USER": os.getenv("DB_USER", "salon"),
+            "PASSWORD": os.getenv("DB_PASSWORD", ""),
+            "HOST": os.getenv("DB_HOST", "localhost"),
+            "PORT": os.getenv("DB_PORT", "5432"),
+            # Постоянные соединения вместо нового на каждый запрос;
+            # перед повторным использованием соединение проверяется
+            "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "60")),
+            "CONN_HEALTH_CHECKS": True,
+            # Пул соединений на все процессы — PgBouncer в режиме
+            # transaction (DB_HOST/DB_PORT указывают на него, DB_PGBOUNCER=1):
+            # серверные курсоры в этом режиме не работают
+            "DISABLE_SERVER_SIDE_CURSORS": env_bool("DB_PGBOUNCER"),
+            "OPTIONS": {},
+        }
     }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.getenv("DB_NAME", BASE_DIR / "db.sqlite3"),
+            # Тестовая база — файл, а не общая память: в памяти SQLite
+            # блокирует таблицы без ожидания, и параллельные тесты записи
+            # падают с «database table is locked». Файл (и -wal/-shm
+            # режима WAL) — во временном каталоге, а не в проекте
+            "TEST": {
+                "NAME": Path(tempfile.gettempdir()) / "salon_test_db.sqlite3"
+            },
+        }
+    }
+    # Второе соединение к тому же файлу только для чтения: в режиме WAL
+    # списки и карточки читают снимок базы и не ждут запись
+    DATABASES["readonly"] = {
+        **DATABASES["default"],
+        "TEST": {"MIRROR": "default"},
+    }
+
+# Реплика для чтения каталога и записей (salon/db.py): для PostgreSQL —
+# DB_REPLICA_HOST, для SQLite — DB_REPLICA_NAME, второй файл базы
+if os.getenv("DB_REPLICA_HOST") or os.getenv("DB_REPLICA_NAME"):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "TEST": {"MIRROR": "default"},
+    }
+    if DB_ENGINE == "postgresql":
+        DATABASES["replica"]["HOST"] = os.getenv("DB_REPLICA_HOST")
+        DATABASES["replica"]["PORT"] = os.getenv(
+            "DB_REPLICA_PORT", DATABASES["default"]["PORT"]
+        )
+    else:
+        DATABASES["replica"]["NAME"] = os.getenv("DB_REPLICA_NAME")
+
+if "replica" in DATABASES:
+    READ_DATABASE = "replica"
+elif "readonly" in DATABASES:
+    READ_DATABASE = "readonly"
+else:
+    READ_DATABASE = "default"
+
+DATABASE_ROUTERS = ["salon.db.ReplicaRouter"]
+
+# Сколько секунд после записи клиент читает из основной базы
+REPLICA_STICKY_SECONDS = int(os.getenv("DB_REPLICA_STICKY_SECONDS", "10"))
+
+# PRAGMA для каждого нового соединения SQLite (bookings/signals.py):
+# WAL — чтение не ждёт запись, busy_timeout — запись ждёт блокировку,
+# а не падает сразу, synchronous=NORMAL — безопасно в режиме WAL;
+# mmap_size и cache_size (в КиБ, если отрицательный) держат горячие
+# страницы в памяти, temp_store — временные таблицы сортировок в памяти
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("DB_SQLITE_JOURNAL_MODE", "WAL"),
+    "busy_timeout": int(os.getenv("DB_SQLITE_BUSY_TIMEOUT", "5000")),
+    "synchronous": os.getenv("DB_SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("DB_SQLITE_MMAP_SIZE", str(256 * 2**20))),
+    "cache_size": int(os.getenv("DB_SQLITE_CACHE_SIZE", "-65536")),
+    "temp_store": "MEMORY",
+}
+# Дополнительно для соединения READ_DATABASE: запрет записи
+SQLITE_READ_PRAGMAS = {
+    "query_only": "ON",
 }
 
+# Кэш без внешнего сервера. По умолчанию — память процесса (разработка,
+# тесты). CACHE_BACKEND=file — файлы в CACHE_DIR, общие для всех
+# воркеров на сервере: у процессов одна версия каталога, и сброс кэша
+# сигналами виден всем
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "locmem")
+if CACHE_BACKEND == "file":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv(
+                "CACHE_DIR", Path(tempfile.gettempdir()) / "salon-cache"
+            ),
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "salon",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    }
+
+# Сколько секунд страницы каталога хранятся в кэше (salon/pagecache.py);
+# изменения мастеров и услуг сбрасывают их раньше
+PAGE_CACHE_TIMEOUT = 60 * 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -145,3 +271,21 @@ EMAIL_FILE_PATH = BASE_DIR / "sent_emails/"
 MEDIA_ROOT = BASE_DIR / "media/"
 
 MEDIA_URL = "/media/"
+
+# Оценочное число записей в админке вместо COUNT(*) по всей таблице
+BOOKINGS_ADMIN_ESTIMATED_COUNT = False
+
+# Самый длинный период поиска ближайшего свободного времени
+# (bookings:earliest_slot), дней; длиннее — ответ 400
+BOOKINGS_EARLIEST_SLOT_MAX_DAYS = 31
+
+# Сколько раз пытаться создать запись при конфликте блокировок БД
+BOOKINGS_RETRY_ATTEMPTS = 5
+
+# Через сколько секунд снимок статистики главной считается устаревшим
+# и пересчитывается в фоне (pages/stats.py)
+HOME_STATS_TTL = 300
+
+# Сколько секунд страница услуги отдаётся из кэша (staff/service_page.py):
+# ограничивает устаревание «ближайшего окна» мастеров
+SERVICE_PAGE_TTL = 60
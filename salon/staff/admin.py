@@ -9,7 +9,10 @@ class MasterServiceInline(admin.TabularInline):
 
 @admin.register(Service)
 class ServiceAdmin(admin.ModelAdmin):
-    list_display = ('title', 'price', 'duration_minutes', 'is_published')
+    list_display = (
+        'title', 'price', 'duration_minutes', 'booking_count',
+        'recent_booking_count', 'is_published'
+    )
     list_editable = ('is_published',)
     list_filter = ('is_published',)
     search_fields = ('title',)
@@ -17,7 +20,10 @@ class ServiceAdmin(admin.ModelAdmin):
 
 @admin.register(Master)
 class MasterAdmin(admin.ModelAdmin):
-    list_display = ('full_name', 'is_published', 'services_list')
+    list_display = (
+        'full_name', 'booking_count', 'recent_booking_count',
+        'is_published', 'services_list'
+    )
     list_editable = ('is_published',)
     list_filter = ('is_published',)
     search_fields = ('first_name', 'last_name')
@@ -8,6 +8,6 @@ class StaffConfig(AppConfig):
     verbose_name = _('Мастера и услуги')
 
     def ready(self):
-        # Заготовка под сигналы (например: уведомление при добавлении нового мастера)
-        # from . import signals
-        pass
+        # Сигналы обновляют версию каталога для кэша и сбрасывают
+        # матрицу времени мастеров между запросами
+        from . import signals  # noqa: F401
@@ -0,0 +1,87 @@
+"""Матрица «мастер × услуга → время выполнения» на время запроса.
+
+Фильтр duration_for читает время из матрицы текущего запроса, а не
+делает запрос к MasterService на каждый вызов. Вью может заранее
+загрузить матрицу для мастеров и услуг страницы (prime) одним
+запросом; если пары в матрице нет, она загружается целиком тоже одним
+запросом. Матрица создаётся заново на каждый запрос (см. signals.py),
+поэтому изменения каталога видны со следующего запроса.
+"""
+from contextlib import contextmanager
+
+from asgiref.local import Local
+
+from .models import MasterService
+
+_local = Local()
+
+
+def _pk(obj):
+    return getattr(obj, 'pk', obj)
+
+
+class DurationMatrix:
+
+    def __init__(self):
+        self._durations = {}
+        # Загруженные области: (id мастеров или None, id услуг или None)
+        self._primed = []
+
+    def _load(self, queryset):
+        self._durations.update(
+            ((master_id, service_id), duration)
+            for master_id, service_id, duration in queryset.values_list(
+                'master_id', 'service_id', 'duration_minutes'
+            )
+        )
+
+    def prime(self, masters=None, services=None):
+        """Загружает время для мастеров и услуг страницы одним запросом."""
+        master_ids = service_ids = None
+        queryset = MasterService.objects.all()
+        if masters is not None:
+            master_ids = {_pk(master) for master in masters}
+            queryset = queryset.filter(master__in=master_ids)
+        if services is not None:
+            service_ids = {_pk(service) for service in services}
+            queryset = queryset.filter(service__in=service_ids)
+        self._load(queryset)
+        self._primed.append((master_ids, service_ids))
+
+    def _covers(self, master_id, service_id):
+        return any(
+            (master_ids is None or master_id in master_ids)
+            and (service_ids is None or service_id in service_ids)
+            for master_ids, service_ids in self._primed
+        )
+
+    def get(self, master, service):
+        """Время мастера на услугу в минутах или None."""
+        key = (_pk(master), _pk(service))
+        if key not in self._durations and not self._covers(*key):
+            # Пара не загружена — догружаем всю матрицу одним запросом
+            self.prime()
+        return self._durations.get(key)
+
+
+def get_matrix():
+    """Матрица текущего запроса (создаётся при первом обращении)."""
+    matrix = getattr(_local, 'matrix', None)
+    if matrix is None:
+        matrix = _local.matrix = DurationMatrix()
+    return matrix
+
+
+def reset_matrix():
+    _local.matrix = None
+
+
+@contextmanager
+def matrix_scope():
+    """Отдельная матрица для кода вне запроса (команды, тесты)."""
+    previous = getattr(_local, 'matrix', None)
+    _local.matrix = DurationMatrix()
+    try:
+        yield _local.matrix
+    finally:
+        _local.matrix = previous
@@ -0,0 +1,94 @@
+"""Рендеринг сетки «мастера × услуги» с фильтром duration_for.
+
+Во временной транзакции (откатывается в конце) создаются --masters
+мастеров и --services услуг, затем сетка рендерится со старой
+реализацией фильтра (запрос на каждую ячейку) и с матрицей времени
+текущего запроса. Печатаются число запросов и время рендеринга.
+"""
+import time
+
+from django import template
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries, transaction
+from django.template import Context, Engine
+from django.test.utils import CaptureQueriesContext
+
+from staff.durations import matrix_scope
+from staff.models import Master, MasterService, Service
+
+GRID_TEMPLATE = (
+    '{%% load %s %%}'
+    '{%% for master in masters %%}'
+    '{%% for service in services %%}'
+    '{{ master|duration_for:service }};'
+    '{%% endfor %%}{%% endfor %%}'
+)
+
+register = template.Library()
+
+
+@register.filter(name='duration_for')
+def legacy_duration_for(master, service):
+    # Прежняя реализация: отдельный запрос на каждую ячейку
+    ms = MasterService.objects.filter(master=master, service=service).first()
+    return ms.duration_minutes if ms else None
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк рендеринга сетки времени мастеров.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--masters', type=int, default=20)
+        parser.add_argument('--services', type=int, default=30)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            masters, services = self.create_grid(
+                options['masters'], options['services']
+            )
+            engine = Engine(libraries={
+                'legacy_durations': __name__,
+                'master_extras': 'staff.templatetags.master_extras',
+            })
+            legacy = engine.from_string(GRID_TEMPLATE % 'legacy_durations')
+            current = engine.from_string(GRID_TEMPLATE % 'master_extras')
+            context = {'masters': masters, 'services': services}
+            for title, template in (
+                ('Запрос на ячейку', legacy),
+                ('Матрица запроса', current),
+            ):
+                self.measure(title, template, context, options['repeat'])
+            transaction.set_rollback(True)
+
+    def create_grid(self, master_count, service_count):
+        services = Service.objects.bulk_create([
+            Service(title=f'bench {i}', price=1000, duration_minutes=60)
+            for i in range(service_count)
+        ])
+        masters = Master.objects.bulk_create([
+            Master(first_name='bench', last_name=str(i))
+            for i in range(master_count)
+        ])
+        MasterService.objects.bulk_create([
+            MasterService(master=master, service=service,
+                          duration_minutes=30 + (i + j) % 4 * 15)
+            for i, master in enumerate(masters)
+            for j, service in enumerate(services)
+            if (i + j) % 5
+        ])
+        return masters, services
+
+    def measure(self, title, template, context, repeat):
+        timings = []
+        for _ in range(repeat):
+            reset_queries()
+            # Каждый повтор — как отдельный запрос со своей матрицей
+            with matrix_scope(), CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                template.render(Context(context))
+                timings.append(time.perf_counter() - started)
+        self.stdout.write(
+            f'{title}: запросов {len(queries)}, '
+            f'рендеринг {min(timings) * 1000:.1f} мс'
+        )
@@ -0,0 +1,68 @@
+"""Сводная матрица «мастера × услуги» со временем выполнения.
+
+Строится одним запросом values_list по MasterService (с JOIN к мастерам
+и услугам) и кэшируется по версии каталога: любое изменение мастера,
+услуги или MasterService (см. signals.py) меняет ключ кэша.
+"""
+from django.core.cache import cache
+
+from .models import MasterService
+from .versioning import get_catalog_version
+
+MATRIX_TIMEOUT = 60 * 60 * 24
+
+
+def build_service_matrix():
+    """Плотная матрица: строки — мастера, столбцы — услуги.
+
+    {'masters': [{id, name, is_published}],
+     'services': [{id, title, price, is_published}],
+     'durations': [[минуты или None для каждой услуги] для каждого мастера]}
+    """
+    rows = MasterService.objects.values_list(
+        'master_id', 'master__first_name', 'master__last_name',
+        'master__is_published',
+        'service_id', 'service__title', 'service__price',
+        'service__is_published',
+        'duration_minutes',
+    )
+    masters = {}
+    services = {}
+    cells = {}
+    for (master_id, first_name, last_name, master_published,
+         service_id, title, price, service_published, duration) in rows:
+        masters[master_id] = ((last_name, first_name), {
+            'id': master_id,
+            'name': f'{first_name} {last_name}',
+            'is_published': master_published,
+        })
+        services[service_id] = {
+            'id': service_id,
+            'title': title,
+            'price': price,
+            'is_published': service_published,
+        }
+        cells[master_id, service_id] = duration
+
+    # Порядок как в Meta.ordering моделей
+    masters = [master for _, master in sorted(
+        masters.values(), key=lambda item: item[0]
+    )]
+    services = sorted(services.values(), key=lambda s: s['title'])
+    return {
+        'masters': masters,
+        'services': services,
+        'durations': [
+            [cells.get((master['id'], service['id'])) for service in services]
+            for master in masters
+        ],
+    }
+
+
+def get_service_matrix():
+    key = f'staff_matrix:{get_catalog_version()}'
+    matrix = cache.get(key)
+    if matrix is None:
+        matrix = build_service_matrix()
+        cache.set(key, matrix, MATRIX_TIMEOUT)
+    return matrix
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.16 on 2026-10-18 06:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('staff', '0002_alter_masterservice_master_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='master',
+            name='booking_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Записей'),
+        ),
+        migrations.AddField(
+            model_name='master',
+            name='recent_booking_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Записей за 30 дней'),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='booking_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Записей'),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='recent_booking_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Записей за 30 дней'),
+        ),
+        migrations.AddIndex(
+            model_name='master',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-booking_count'], name='master_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='master',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-recent_booking_count'], name='master_recent_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-booking_count'], name='service_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-recent_booking_count'], name='service_recent_popular_idx'),
+        ),
+    ]
@@ -4,7 +4,7 @@ from django.core.validators import MinValueValidator
 
 
 class PublishedModel(models.Model):
-    """Абстрактная модель с флагом публикации и датой создания."""
+    """Абстрактная модель с флагом публикации, датами создания и изменения."""
     is_published = models.BooleanField(
         verbose_name='Опубликовано',
         default=True,
@@ -14,12 +14,34 @@ class PublishedModel(models.Model):
         verbose_name='Добавлено',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Изменено',
+        auto_now=True
+    )
 
     class Meta:
         abstract = True
 
 
-class Service(PublishedModel):
+class PopularityCountersMixin:
+    """Не перезаписывает счётчики популярности при сохранении.
+
+    Счётчики меняются только UPDATE через F() (bookings/popularity.py);
+    объект, загруженный раньше, не должен затирать их старыми значениями.
+    """
+    COUNTER_FIELDS = ('booking_count', 'recent_booking_count')
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
+class Service(PopularityCountersMixin, PublishedModel):
     """Услуга (стрижка, окрашивание и т.д.)"""
     title = models.CharField(
         max_length=256,
@@ -39,11 +61,35 @@ class Service(PublishedModel):
         verbose_name='Длительность (мин)',
         help_text='Сколько времени занимает услуга'
     )
+    # Счётчики популярности (bookings/popularity.py)
+    booking_count = models.PositiveIntegerField(
+        verbose_name='Записей',
+        default=0,
+        editable=False
+    )
+    recent_booking_count = models.PositiveIntegerField(
+        verbose_name='Записей за 30 дней',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'услуга'
         verbose_name_plural = 'Услуги'
         ordering = ('title',)
+        indexes = [
+            # «Топ N» опубликованных услуг — просмотр частичного индекса
+            models.Index(
+                fields=['-booking_count'],
+                condition=models.Q(is_published=True),
+                name='service_popular_idx',
+            ),
+            models.Index(
+                fields=['-recent_booking_count'],
+                condition=models.Q(is_published=True),
+                name='service_recent_popular_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.title} — {self.price} ₽'
@@ -52,7 +98,7 @@ class Service(PublishedModel):
         return reverse('staff:service_detail', kwargs={'pk': self.pk})
 
 
-class Master(PublishedModel):
+class Master(PopularityCountersMixin, PublishedModel):
     """Мастер парикмахерской"""
     first_name = models.CharField(
         max_length=100,
@@ -73,11 +119,34 @@ class Master(PublishedModel):
         verbose_name='Услуги',
         related_name='masters'
     )
+    # Счётчики популярности (bookings/popularity.py)
+    booking_count = models.PositiveIntegerField(
+        verbose_name='Записей',
+        default=0,
+        editable=False
+    )
+    recent_booking_count = models.PositiveIntegerField(
+        verbose_name='Записей за 30 дней',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'мастер'
         verbose_name_plural = 'Мастера'
         ordering = ('last_name', 'first_name')
+        indexes = [
+            models.Index(
+                fields=['-booking_count'],
+                condition=models.Q(is_published=True),
+                name='master_popular_idx',
+            ),
+            models.Index(
+                fields=['-recent_booking_count'],
+                condition=models.Q(is_published=True),
+                name='master_recent_popular_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.first_name} {self.last_name}'
@@ -104,6 +173,10 @@ class MasterService(models.Model):
         verbose_name='Время выполнения (мин)',
         help_text='Индивидуальное время для этого мастера'
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Изменено',
+        auto_now=True
+    )
 
     class Meta:
         verbose_name = 'услуга мастера'
@@ -0,0 +1,98 @@
+"""Данные страницы услуги одним кэшированным объектом.
+
+Страница услуги собирается из словаря: поля услуги и опубликованные
+мастера, оказывающие её, по возрастанию времени выполнения, у каждого —
+ближайшее свободное окно в SLOT_SEARCH_DAYS дней. Без кэша это три
+запроса (услуга, мастера, записи мастеров за окно).
+
+Изменение мастера, услуги или MasterService удаляет данные затронутых
+услуг (см. signals.py). Свободные окна меняются с каждой записью, поэтому
+данные живут не дольше SERVICE_PAGE_TTL секунд: окно на странице —
+подсказка, занятость всё равно проверяется при создании записи.
+"""
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from bookings.availability import next_free_slots
+from .models import MasterService, Service
+
+SLOT_SEARCH_DAYS = 14
+
+
+def _cache_key(service_id):
+    return f'service_page:{service_id}'
+
+
+def service_page_ttl():
+    return getattr(settings, 'SERVICE_PAGE_TTL', 60)
+
+
+def build_service_page(service_id):
+    """Собирает данные страницы услуги или возвращает None."""
+    service = Service.objects.filter(pk=service_id).values(
+        'id', 'title', 'description', 'price', 'duration_minutes'
+    ).first()
+    if service is None:
+        return None
+
+    rows = MasterService.objects.filter(
+        service_id=service_id, master__is_published=True
+    ).values_list(
+        'master_id', 'master__first_name', 'master__last_name',
+        'master__photo', 'duration_minutes',
+    ).order_by('duration_minutes', 'master__last_name', 'master__first_name')
+    masters = [{
+        'id': master_id,
+        'first_name': first_name,
+        'last_name': last_name,
+        'name': f'{first_name} {last_name}',
+        'photo_url': default_storage.url(photo) if photo else '',
+        'duration_minutes': duration,
+    } for master_id, first_name, last_name, photo, duration in rows]
+
+    if masters:
+        now = timezone.now()
+        slots = next_free_slots(
+            {master['id']: master['duration_minutes'] for master in masters},
+            now, now + timedelta(days=SLOT_SEARCH_DAYS),
+        )
+        for master in masters:
+            master['next_slot'] = slots[master['id']]
+
+    return {
+        'service': service,
+        'masters': masters,
+        'built_at': time.time(),
+    }
+
+
+def get_service_page(service_id):
+    key = _cache_key(service_id)
+    page = cache.get(key)
+    if page is None:
+        page = build_service_page(service_id)
+        if page is not None:
+            cache.set(key, page, service_page_ttl())
+    return page
+
+
+def page_last_modified(page):
+    return datetime.fromtimestamp(int(page['built_at']), dt_timezone.utc)
+
+
+def invalidate_services(service_ids):
+    cache.delete_many([_cache_key(pk) for pk in service_ids])
+
+
+def invalidate_master(master_id):
+    """Сбрасывает страницы всех услуг мастера."""
+    invalidate_services(
+        MasterService.objects.filter(master_id=master_id).values_list(
+            'service_id', flat=True
+        )
+    )
@@ -0,0 +1,59 @@
+from django.core.signals import request_finished, request_started
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .durations import reset_matrix
+from .models import Master, MasterService, Service
+from .service_page import invalidate_master, invalidate_services
+from .versioning import bump_catalog_version
+
+
+@receiver(post_save, sender=Master)
+@receiver(post_delete, sender=Master)
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=MasterService)
+@receiver(post_delete, sender=MasterService)
+@receiver(m2m_changed, sender=Master.services.through)
+def catalog_changed(sender, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Master)
+def master_changed(sender, instance, **kwargs):
+    # При удалении мастера строки MasterService удаляются каскадом
+    # со своими сигналами, поэтому post_delete здесь не нужен
+    invalidate_master(instance.pk)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def service_changed(sender, instance, **kwargs):
+    invalidate_services([instance.pk])
+
+
+@receiver(post_save, sender=MasterService)
+@receiver(post_delete, sender=MasterService)
+def master_service_changed(sender, instance, **kwargs):
+    invalidate_services([instance.service_id])
+
+
+@receiver(m2m_changed, sender=Master.services.through)
+def master_services_changed(sender, instance, action, reverse, pk_set,
+                            **kwargs):
+    # Master.services.add()/remove() не вызывают post_save у MasterService
+    if reverse:
+        if action.startswith('post_'):
+            invalidate_services([instance.pk])
+    elif action == 'pre_clear':
+        # После очистки услуги мастера уже не найти
+        invalidate_master(instance.pk)
+    elif action in ('post_add', 'post_remove'):
+        invalidate_services(pk_set)
+
+
+@receiver(request_started)
+@receiver(request_finished)
+def reset_duration_matrix(sender, **kwargs):
+    # Матрица времени мастеров живёт не дольше одного запроса
+    reset_matrix()
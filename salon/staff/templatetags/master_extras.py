@@ -1,10 +1,14 @@
 from django import template
-from ..models import MasterService
+
+from ..durations import get_matrix
 
 register = template.Library()
 
 @register.filter
 def duration_for(master, service):
-    """Использование: {{ master|duration_for:service }}"""
-    ms = MasterService.objects.filter(master=master, service=service).first()
-    return ms.duration_minutes if ms else None
\ No newline at end of file
+    """Использование: {{ master|duration_for:service }}
+
+    Время берётся из матрицы текущего запроса (staff/durations.py):
+    не больше одного запроса на всю сетку мастеров и услуг.
+    """
+    return get_matrix().get(master, service)
@@ -27,4 +27,11 @@ urlpatterns = [
         views.ServiceDetailView.as_view(),
         name='service_detail'
     ),
+
+    # Матрица «мастера × услуги»
+    path(
+        'matrix/',
+        views.MasterServiceMatrixView.as_view(),
+        name='matrix'
+    ),
 ]
@@ -0,0 +1,89 @@
+"""Версия каталога мастеров и услуг для кэширования и условных GET.
+
+Версия — момент последнего изменения Master, Service или MasterService
+(UNIX-время), хранится в кэше и обновляется сигналами (см. signals.py).
+Ключи кэшированных фрагментов включают версию, поэтому после изменения
+каталога старые фрагменты просто перестают читаться.
+
+ETag и Last-Modified считаются по самим таблицам (catalog_state) одним
+запросом MAX(updated_at) и числа строк, поэтому одинаковы во всех
+процессах, даже без общего кэша.
+"""
+import time
+
+from django.core.cache import cache
+from django.db.models import Count, Max, Value
+from django.views.decorators.http import condition
+
+from .models import Master, MasterService, Service
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Версия потеряна (рестарт, вытеснение) — считаем каталог новым
+        version = bump_catalog_version()
+    return version
+
+
+def bump_catalog_version():
+    version = time.time()
+    cache.set(CATALOG_VERSION_KEY, version, None)
+    return version
+
+
+def catalog_state():
+    """Последнее изменение каталога и отпечаток для ETag одним запросом.
+
+    UNION ALL из MAX(updated_at) и COUNT(*) мастеров, услуг и
+    MasterService. Число строк нужно, чтобы заметить удаление: MAX от
+    него не меняется. Возвращает (datetime или None, строка).
+    """
+    queries = [
+        model.objects.order_by().annotate(table=Value(index)).values(
+            'table'
+        ).annotate(
+            latest=Max('updated_at'), rows=Count('pk')
+        ).values_list('table', 'latest', 'rows')
+        for index, model in enumerate((Master, Service, MasterService))
+    ]
+    rows = sorted(queries[0].union(*queries[1:], all=True))
+    last_modified = max(
+        (latest for _, latest, _ in rows if latest is not None), default=None
+    )
+    stamp = last_modified.timestamp() if last_modified else 0
+    counts = '-'.join(str(count) for _, _, count in rows)
+    return last_modified, f'{stamp:.6f}-{counts}'
+
+
+def request_catalog_state(request):
+    """catalog_state() один раз на запрос.
+
+    ETag, Last-Modified и ключи кэша, которые должны совпадать с ETag,
+    читают одно и то же значение.
+    """
+    if not hasattr(request, 'catalog_state'):
+        request.catalog_state = catalog_state()
+    return request.catalog_state
+
+
+def catalog_condition(etag_suffix=None):
+    """Условный GET по состоянию каталога: 304 без рендера шаблона.
+
+    etag_suffix(request) добавляет к ETag то, от чего ещё зависит ответ
+    (пользователь, параметры запроса).
+    """
+    def etag_func(request, *args, **kwargs):
+        etag = request_catalog_state(request)[1]
+        if etag_suffix is not None:
+            etag = f'{etag}-{etag_suffix(request)}'
+        return etag
+
+    def last_modified_func(request, *args, **kwargs):
+        return request_catalog_state(request)[0]
+
+    return condition(
+        etag_func=etag_func, last_modified_func=last_modified_func
+    )
@@ -1,13 +1,54 @@
-from django.views.generic import ListView, DetailView
+import csv
+
+from django.contrib.auth.mixins import PermissionRequiredMixin
+from django.db.models import Count, Prefetch, Q
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django.views.generic import ListView, DetailView, TemplateView
+
+from salon.pagecache import PageCacheMixin
+from .matrix import get_service_matrix
 from .models import Master, Service
+from .service_page import (
+    get_service_page, page_last_modified, service_page_ttl
+)
+from .versioning import catalog_condition
+
+
+def _user_etag(request):
+    # Шапка и кнопки записи зависят от пользователя
+    user = request.user
+    return f'{user.pk or 0}-{int(user.is_staff)}'
+
+
+# На get, а не на dispatch: кэш страниц для анонимов (PageCacheMixin)
+# отвечает раньше и без запросов к базе
+catalog_conditional_get = method_decorator(
+    catalog_condition(etag_suffix=_user_etag), name='get'
+)
 
-class MasterListView(ListView):
+
+@catalog_conditional_get
+class MasterListView(PageCacheMixin, ListView):
     model = Master
     template_name = 'staff/master_list.html'
     context_object_name = 'masters'
-    queryset = Master.objects.filter(is_published=True)
+    paginate_by = 12
+    # Опубликованные услуги мастеров страницы — одним запросом,
+    # их число — в том же запросе, что и мастера
+    queryset = Master.objects.filter(is_published=True).annotate(
+        published_services_count=Count(
+            'services', filter=Q(services__is_published=True)
+        )
+    ).prefetch_related(Prefetch(
+        'services',
+        queryset=Service.objects.filter(is_published=True),
+        to_attr='published_services'
+    ))
 
-class MasterDetailView(DetailView):
+@catalog_conditional_get
+class MasterDetailView(PageCacheMixin, DetailView):
     model = Master
     template_name = 'staff/master_detail.html'
     context_object_name = 'master'
@@ -17,28 +58,91 @@ class MasterDetailView(DetailView):
             'offered_services__service'  # здесь делаем JOIN к услугам
         )
 
-class ServiceListView(ListView):
+@catalog_conditional_get
+class ServiceListView(PageCacheMixin, ListView):
     model = Service
     template_name = 'staff/service_list.html'
     context_object_name = 'services'
     queryset = Service.objects.filter(is_published=True)
 
-class ServiceDetailView(DetailView):
-    model = Service
+def _service_page(request, pk):
+    # Данные страницы нужны и условному GET, и шаблону — читаем кэш один раз
+    if not hasattr(request, 'service_page'):
+        request.service_page = get_service_page(pk)
+    return request.service_page
+
+
+def _service_etag(request, pk):
+    page = _service_page(request, pk)
+    if page is None:
+        return None
+    return f'service-{pk}-{page["built_at"]}-{_user_etag(request)}'
+
+
+def _service_last_modified(request, pk):
+    page = _service_page(request, pk)
+    return page and page_last_modified(page)
+
+
+@method_decorator(
+    condition(
+        etag_func=_service_etag, last_modified_func=_service_last_modified
+    ),
+    name='get'
+)
+class ServiceDetailView(PageCacheMixin, TemplateView):
+    """Страница услуги из кэшированных данных (см. service_page.py)."""
     template_name = 'staff/service_detail.html'
-    context_object_name = 'service'
+
+    def get_page_cache_timeout(self):
+        # Страница показывает свободные окна — не дольше данных услуги
+        return service_page_ttl()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        service = self.object
-
-        masters_with_time = []
-        # Используем НОВОЕ имя: provided_by_masters
-        for ms in service.provided_by_masters.select_related('master'):
-            masters_with_time.append({
-                'master': ms.master,
-                'duration_minutes': ms.duration_minutes
-            })
-        
-        context['masters_with_time'] = masters_with_time
+        page = _service_page(self.request, self.kwargs['pk'])
+        if page is None:
+            raise Http404('Услуга не найдена')
+        context['service'] = page['service']
+        context['masters_with_time'] = page['masters']
         return context
+
+
+@catalog_conditional_get
+class MasterServiceMatrixView(PermissionRequiredMixin, TemplateView):
+    """Матрица «мастера × услуги» для планирования смен.
+
+    ?format=csv или ?format=json — выгрузка той же матрицы.
+    """
+    template_name = 'staff/matrix.html'
+    permission_required = 'staff.view_masterservice'
+
+    def get(self, request, *args, **kwargs):
+        data = get_service_matrix()
+        export = request.GET.get('format')
+        if export == 'json':
+            return JsonResponse(
+                data, json_dumps_params={'ensure_ascii': False}
+            )
+        if export == 'csv':
+            return self.render_csv(data)
+        context = self.get_context_data(**kwargs)
+        context['masters'] = data['masters']
+        context['services'] = data['services']
+        context['rows'] = zip(data['masters'], data['durations'])
+        return self.render_to_response(context)
+
+    def render_csv(self, data):
+        response = HttpResponse(content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="matrix.csv"'
+        # BOM — чтобы Excel открыл файл в UTF-8
+        response.write('\ufeff')
+        writer = csv.writer(response)
+        writer.writerow(
+            ['Мастер'] + [service['title'] for service in data['services']]
+        )
+        for master, durations in zip(data['masters'], data['durations']):
+            writer.writerow([master['name']] + [
+                '' if minutes is None else minutes for minutes in durations
+            ])
+        return response
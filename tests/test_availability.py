@@ -0,0 +1,166 @@
+from datetime import datetime, time, timedelta
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+
+from bookings import availability
+from bookings.models import Booking, BookingService
+from staff.models import Master, MasterService, Service
+
+
+def _next_monday():
+    today = timezone.localdate()
+    return today + timedelta(days=7 - today.weekday())
+
+
+def _at(day, hour, minute=0):
+    return timezone.make_aware(datetime.combine(day, time(hour, minute)))
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+@pytest.fixture
+def master():
+    return Master.objects.create(first_name='Анна', last_name='Иванова')
+
+
+@pytest.fixture
+def long_service(master):
+    service = Service.objects.create(
+        title='Окрашивание', price=3000, duration_minutes=90
+    )
+    MasterService.objects.create(
+        master=master, service=service, duration_minutes=180
+    )
+    return service
+
+
+@pytest.fixture
+def client_user():
+    return get_user_model().objects.create_user(
+        username='client', password='password'
+    )
+
+
+def _book(user, master, service, start):
+    booking = Booking.objects.create(
+        user=user, master=master, visit_datetime=start
+    )
+    BookingService.objects.create(
+        booking=booking, service=service, price_at_booking=service.price
+    )
+    return booking
+
+
+def test_day_schedule_detects_overlaps():
+    day = _next_monday()
+    schedule = availability.DaySchedule([
+        (_at(day, 10), _at(day, 13), 1),
+        (_at(day, 14), _at(day, 15), 2),
+    ])
+    assert not schedule.is_free(_at(day, 12), _at(day, 12, 30))
+    assert not schedule.is_free(_at(day, 12, 45), _at(day, 14, 15))
+    assert schedule.is_free(_at(day, 13), _at(day, 14))
+    assert schedule.is_free(_at(day, 15), _at(day, 16))
+    assert schedule.without(1).is_free(_at(day, 11), _at(day, 12))
+
+
+def test_day_schedule_free_slots_skip_busy_intervals():
+    day = _next_monday()
+    schedule = availability.DaySchedule([
+        (_at(day, 10), _at(day, 20, 10), 1),
+    ])
+    assert schedule.free_slots(day, 30, step=15) == [
+        _at(day, 20, 15), _at(day, 20, 30)
+    ]
+
+
+@pytest.mark.django_db
+def test_long_earlier_booking_blocks_later_slot(
+    client_user, master, long_service
+):
+    """Конец записи считается по её услугам, а не по длительности новой."""
+    day = _next_monday()
+    _book(client_user, master, long_service, _at(day, 10))
+    assert not availability.is_slot_free(
+        master.pk, _at(day, 12), _at(day, 12, 30)
+    )
+    assert availability.is_slot_free(master.pk, _at(day, 13), _at(day, 14))
+
+
+@pytest.mark.django_db
+def test_schedule_is_loaded_once_per_master_day(
+    client_user, master, long_service, django_assert_num_queries
+):
+    day = _next_monday()
+    _book(client_user, master, long_service, _at(day, 10))
+    with django_assert_num_queries(1):
+        for hour in range(10, 20):
+            availability.is_slot_free(
+                master.pk, _at(day, hour), _at(day, hour, 30)
+            )
+    _book(client_user, master, long_service, _at(day, 15))
+    assert not availability.is_slot_free(
+        master.pk, _at(day, 16), _at(day, 16, 30)
+    )
+
+
+@pytest.mark.django_db
+def test_earliest_slot_picks_first_free_master(
+    client_user, master, long_service, django_assert_num_queries
+):
+    day = _next_monday()
+    masters = [
+        Master.objects.create(first_name='Мастер', last_name=str(i))
+        for i in range(3)
+    ]
+    for m in masters:
+        MasterService.objects.create(
+            master=m, service=long_service, duration_minutes=60
+        )
+    # Свободный с открытия мастер скрыт, остальные заняты с утра
+    Master.objects.filter(pk=masters[0].pk).update(is_published=False)
+    _book(client_user, master, long_service, _at(day, 10))
+    _book(client_user, masters[1], long_service, _at(day, 10))
+    _book(client_user, masters[2], long_service, _at(day, 10, 30))
+
+    window_start, window_end = _at(day, 0), _at(day + timedelta(days=14), 0)
+    with django_assert_num_queries(2):
+        found = availability.earliest_slot(
+            [long_service.pk], window_start, window_end
+        )
+    assert found == (masters[1].pk, _at(day, 11), 60)
+
+
+
+@pytest.mark.django_db
+def test_earliest_slot_endpoint_bounds_the_window(client, long_service):
+    url = '/bookings/earliest-slot/'
+    today = timezone.localdate()
+
+    def get(date_from, date_to):
+        return client.get(url, {
+            'services': long_service.pk,
+            'date_from': date_from.isoformat(),
+            'date_to': date_to.isoformat(),
+        })
+
+    assert get(today, today + timedelta(days=30)).status_code == 200
+    # Прошлое, перевёрнутый и слишком длинный период
+    assert get(today - timedelta(days=1), today).status_code == 400
+    assert get(today + timedelta(days=2), today).status_code == 400
+    assert get(today, today + timedelta(days=31)).status_code == 400
+
+def test_overlapping_query_matches_partial_index_condition():
+    """Статусы — литералы, иначе SQLite не применит частичный индекс."""
+    day = _next_monday()
+    sql, params = availability.overlapping(
+        1, _at(day, 10), _at(day, 11)
+    ).query.sql_with_params()
+    assert "IN ('pending', 'confirmed')" in sql
+    assert 'pending' not in params
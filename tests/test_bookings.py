@@ -0,0 +1,641 @@
+from datetime import datetime, time, timedelta
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+
+from bookings.models import Booking, BookingService
+from staff.models import Master, MasterService, Service
+
+
+def _visit_time(hour=12):
+    day = timezone.localdate() + timedelta(days=7)
+    return timezone.make_aware(datetime.combine(day, time(hour)))
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+@pytest.fixture
+def client_user():
+    return get_user_model().objects.create_user(
+        username='client', password='password'
+    )
+
+
+@pytest.fixture
+def master():
+    return Master.objects.create(first_name='Анна', last_name='Иванова')
+
+
+@pytest.fixture
+def services(master):
+    result = []
+    for title, minutes in (('Стрижка', 45), ('Укладка', 30)):
+        service = Service.objects.create(
+            title=title, price=1000, duration_minutes=60
+        )
+        MasterService.objects.create(
+            master=master, service=service, duration_minutes=minutes
+        )
+        result.append(service)
+    return result
+
+
+@pytest.mark.django_db
+def test_totals_follow_booking_services(client_user, master, services):
+    booking = Booking.objects.create(
+        user=client_user, master=master, visit_datetime=_visit_time()
+    )
+    assert booking.end_datetime == _visit_time() + timedelta(minutes=60)
+
+    for service in services:
+        BookingService.objects.create(
+            booking=booking, service=service, price_at_booking=service.price
+        )
+    booking.refresh_from_db()
+    assert booking.duration_minutes == 75
+    assert booking.end_datetime == _visit_time() + timedelta(minutes=75)
+    assert booking.total_cost == 2000
+
+    booking.booking_services.filter(service=services[0]).delete()
+    booking.refresh_from_db()
+    assert booking.duration_minutes == 30
+    assert booking.total_cost == 1000
+
+
+@pytest.mark.django_db
+def test_create_booking_query_count_does_not_grow_with_services(
+    client_user, master, services
+):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    from bookings.services import create_booking
+
+    counts = []
+    for hour, chosen in ((10, services[:1]), (14, services)):
+        with CaptureQueriesContext(connection) as ctx:
+            booking = create_booking(
+                client_user, master, chosen, _visit_time(hour)
+            )
+        counts.append(len(ctx.captured_queries))
+        assert booking.booking_services.count() == len(chosen)
+    assert counts[0] == counts[1]
+
+    booking.refresh_from_db()
+    assert booking.end_datetime == _visit_time(14) + timedelta(minutes=75)
+    assert booking.total_cost == 2000
+
+
+@pytest.mark.django_db
+def test_booking_form_query_count_does_not_grow_with_services(
+    master, services, django_assert_num_queries
+):
+    """Регрессия N+1: длительности услуг мастера читаются одним запросом."""
+    from bookings.forms import BookingForm
+
+    for chosen in (services[:1], services):
+        form = BookingForm(data={
+            'master': master.pk,
+            'services': [s.pk for s in chosen],
+            'visit_datetime': _visit_time().strftime('%Y-%m-%dT%H:%M'),
+        })
+        # мастер и услуги в полях, длительности, расписание дня
+        with django_assert_num_queries(4):
+            assert form.is_valid(), form.errors
+        assert form.duration_minutes == sum(
+            form.durations[s.pk] for s in chosen
+        )
+        cache.clear()
+
+
+@pytest.mark.django_db
+def test_booking_view_validates_once(
+    client, client_user, master, services, monkeypatch
+):
+    """create_booking не повторяет проверку, уже сделанную формой."""
+    from bookings import forms, services as booking_services
+
+    calls = []
+
+    def counting(*args, **kwargs):
+        calls.append(args)
+        return validate(*args, **kwargs)
+
+    validate = booking_services.validate_booking
+    monkeypatch.setattr(forms, 'validate_booking', counting)
+    monkeypatch.setattr(booking_services, 'validate_booking', counting)
+
+    client.force_login(client_user)
+    response = client.post('/bookings/', {
+        'master': master.pk,
+        'services': [s.pk for s in services],
+        'visit_datetime': _visit_time().strftime('%Y-%m-%dT%H:%M'),
+    })
+    assert response.status_code == 302
+    assert Booking.objects.filter(user=client_user).count() == 1
+    assert len(calls) == 1
+
+
+@pytest.mark.django_db
+def test_free_slots_endpoint_skips_busy_time(
+    client, client_user, master, services
+):
+    from django.urls import reverse
+
+    from bookings.services import create_booking
+
+    create_booking(client_user, master, services, _visit_time(12))
+    response = client.get(reverse('bookings:free_slots'), {
+        'master': master.pk,
+        'services': [s.pk for s in services],
+        'date': _visit_time().date().isoformat(),
+    })
+    assert response.status_code == 200
+    slots = response.json()['slots']
+    assert slots
+    busy_from = _visit_time(12) - timedelta(minutes=75)
+    busy_to = _visit_time(12) + timedelta(minutes=75)
+    for slot in slots:
+        start = datetime.fromisoformat(slot)
+        assert not busy_from < start < busy_to
+
+
+@pytest.mark.django_db
+def test_free_slots_endpoint_rejects_foreign_service(client, master):
+    from django.urls import reverse
+
+    other = Service.objects.create(
+        title='Маникюр', price=500, duration_minutes=30
+    )
+    response = client.get(reverse('bookings:free_slots'), {
+        'master': master.pk,
+        'services': [other.pk],
+        'date': _visit_time().date().isoformat(),
+    })
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_update_services_fragment_is_cached_and_versioned(
+    client, master, services, django_assert_num_queries
+):
+    from django.urls import reverse
+
+    url = reverse('bookings:update_services')
+    response = client.get(url, {'master': master.pk})
+    content = response.content.decode()
+    assert '45 мин' in content, 'Нужна длительность услуги у мастера'
+    assert '60 мин' not in content
+
+    # Только MAX(updated_at) каталога для ETag, фрагмент — из кэша
+    with django_assert_num_queries(2):
+        cached = client.get(url, {'master': master.pk})
+        not_modified = client.get(
+            url, {'master': master.pk}, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+    assert cached.content == response.content
+    assert not_modified.status_code == 304
+
+    # Процесс не заметил смены версии каталога в своём кэше — фрагмент
+    # всё равно ищется по состоянию каталога из БД, как и ETag
+    from staff.versioning import CATALOG_VERSION_KEY
+    version = cache.get(CATALOG_VERSION_KEY)
+    offered = MasterService.objects.get(master=master, service=services[0])
+    offered.duration_minutes = 50
+    offered.save()
+    cache.set(CATALOG_VERSION_KEY, version, None)
+    changed = client.get(
+        url, {'master': master.pk}, HTTP_IF_NONE_MATCH=response['ETag']
+    )
+    assert changed.status_code == 200
+    assert '50 мин' in changed.content.decode()
+
+
+@pytest.mark.django_db
+def test_update_services_rejects_bad_master_id(client):
+    from django.urls import reverse
+
+    url = reverse('bookings:update_services')
+    for master_id in ('x' * 100, '1 OR 1', '-1'):
+        response = client.get(url, {'master': master_id})
+        assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_admin_changelist_query_count_does_not_grow_with_rows(
+    admin_client, master, services
+):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import reverse
+
+    from bookings.services import create_booking
+
+    url = reverse('admin:bookings_booking_changelist')
+    counts = []
+    for index, hour in enumerate((10, 12, 14, 16, 18)):
+        user = get_user_model().objects.create_user(username=f'user{index}')
+        create_booking(user, master, services[:1], _visit_time(hour))
+        with CaptureQueriesContext(connection) as ctx:
+            assert admin_client.get(url).status_code == 200
+        counts.append(len(ctx.captured_queries))
+    assert len(set(counts[1:])) == 1, counts
+
+
+@pytest.mark.django_db
+def test_apply_transition_filters_by_allowed_sources(
+    client_user, master, services, django_assert_num_queries
+):
+    from bookings.services import create_booking
+    from bookings.transitions import apply_transition
+
+    bookings = [
+        create_booking(client_user, master, services[:1], _visit_time(hour))
+        for hour in (10, 12, 14, 16)
+    ]
+    Booking.objects.filter(pk=bookings[0].pk).update(status='cancelled')
+    past = timezone.now() - timedelta(days=1)
+    Booking.objects.filter(pk=bookings[1].pk).update(visit_datetime=past)
+
+    with django_assert_num_queries(2):
+        result = apply_transition(Booking.objects.all(), 'confirmed')
+    assert result == (3, 1)
+
+    result = apply_transition(Booking.objects.all(), 'completed')
+    assert result == (1, 3)
+    completed = Booking.objects.get(pk=bookings[1].pk)
+    assert completed.status == 'completed'
+    assert completed.completed_at is not None
+    assert completed.confirmed_at is not None
+
+
+@pytest.mark.django_db
+def test_cancel_frees_slot_only_once(client_user, master, services):
+    from bookings import availability
+    from bookings.services import create_booking
+
+    booking = create_booking(client_user, master, services, _visit_time())
+    end = _visit_time() + timedelta(minutes=30)
+    assert not availability.is_slot_free(master.pk, _visit_time(), end)
+
+    assert booking.cancel()
+    assert booking.cancelled_at is not None
+    assert availability.is_slot_free(master.pk, _visit_time(), end)
+    assert not booking.cancel()
+
+
+@pytest.mark.django_db
+def test_sweep_expires_pending_and_completes_confirmed(
+    client_user, master, services
+):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    from bookings.services import create_booking
+    from bookings.sweeper import sweep
+
+    bookings = [
+        create_booking(client_user, master, services[:1], _visit_time(hour))
+        for hour in (10, 12, 14, 16, 18)
+    ]
+    Booking.objects.filter(pk__in=[b.pk for b in bookings[:3]]).update(
+        status='confirmed'
+    )
+    # Всё, кроме последней записи, уже в прошлом
+    now = _visit_time(17)
+
+    with CaptureQueriesContext(connection) as queries:
+        run = sweep(now=now, batch_size=2)
+    assert (run.expired, run.completed, run.batches) == (1, 3, 3)
+    # Пачки выбираются по частичному индексу активных записей
+    select = next(
+        q['sql'] for q in queries.captured_queries
+        if q['sql'].startswith('SELECT') and 'end_datetime' in q['sql']
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {select}')
+        plan = ' '.join(row[-1] for row in cursor.fetchall())
+    assert 'booking_active_master_idx' in plan
+    statuses = dict(Booking.objects.values_list('pk', 'status'))
+    assert [statuses[b.pk] for b in bookings] == [
+        'completed', 'completed', 'completed', 'cancelled', 'pending'
+    ]
+
+
+@pytest.mark.django_db(transaction=True, databases='__all__')
+def test_parallel_bookings_of_one_slot_create_exactly_one(master, services):
+    from concurrent.futures import ThreadPoolExecutor
+    from threading import Barrier
+
+    from django.core.exceptions import ValidationError
+    from django.db import connection
+
+    from bookings.services import create_booking
+
+    threads = 200
+    users = [
+        get_user_model().objects.create_user(username=f'parallel{i}')
+        for i in range(threads)
+    ]
+    barrier = Barrier(threads)
+
+    def book(user):
+        barrier.wait()
+        try:
+            create_booking(user, master, services, _visit_time())
+            return 'created'
+        except ValidationError:
+            return 'taken'
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(book, users))
+
+    assert results.count('created') == 1
+    assert results.count('taken') == threads - 1
+    assert Booking.objects.filter(master=master).count() == 1
+
+
+def test_retry_on_conflict_repeats_only_lock_errors(monkeypatch):
+    from django.core.exceptions import ValidationError
+    from django.db import OperationalError
+
+    from bookings import retry
+
+    monkeypatch.setattr(retry.time, 'sleep', lambda seconds: None)
+    retry.reset_retry_stats()
+    calls = []
+
+    @retry.retry_on_conflict(attempts=3)
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise OperationalError('database is locked')
+        return 'ok'
+
+    @retry.retry_on_conflict(attempts=3)
+    def invalid():
+        calls.append(1)
+        raise ValidationError('Время занято')
+
+    assert flaky() == 'ok'
+    assert retry.retry_stats() == {
+        'attempts': 3, 'conflicts': 2, 'retries': 2, 'exhausted': 0,
+    }
+
+    calls.clear()
+    with pytest.raises(ValidationError):
+        invalid()
+    assert len(calls) == 1
+
+    @retry.retry_on_conflict(attempts=2)
+    def locked():
+        raise OperationalError('database is locked')
+
+    with pytest.raises(OperationalError):
+        locked()
+    assert retry.retry_stats()['exhausted'] == 1
+
+
+@pytest.mark.django_db
+def test_sqlite_connection_uses_configured_pragmas():
+    from django.db import connection
+
+    if connection.vendor != 'sqlite':
+        pytest.skip('PRAGMA только для SQLite')
+    with connection.cursor() as cursor:
+        journal_mode = cursor.execute('PRAGMA journal_mode').fetchone()[0]
+        synchronous = cursor.execute('PRAGMA synchronous').fetchone()[0]
+        busy_timeout = cursor.execute('PRAGMA busy_timeout').fetchone()[0]
+    assert (journal_mode, synchronous, busy_timeout) == ('wal', 1, 5000)
+
+
+@pytest.mark.django_db(transaction=True, databases='__all__')
+def test_reads_use_read_database_until_client_writes(
+    client, client_user, master, services
+):
+    from django.conf import settings
+    from django.db import OperationalError
+
+    from bookings.services import create_booking
+    from salon.db import STICKY_COOKIE
+
+    booking = create_booking(client_user, master, services, _visit_time())
+    client.force_login(client_user)
+    response = client.get('/bookings/my/')
+    [shown] = response.context['bookings']
+    assert shown._state.db == settings.READ_DATABASE
+    assert STICKY_COOKIE not in response.cookies
+
+    # Отмена пишет в основную базу, и клиент читает из неё дальше
+    response = client.post(f'/bookings/{booking.pk}/cancel/')
+    assert STICKY_COOKIE in response.cookies
+    response = client.get('/bookings/my/')
+    [shown] = response.context['bookings']
+    assert shown._state.db == 'default'
+    assert shown.status == 'cancelled'
+
+    # Соединение для чтения не пишет
+    with pytest.raises(OperationalError):
+        Master.objects.using(settings.READ_DATABASE).create(
+            first_name='Ольга', last_name='Петрова'
+        )
+
+
+@pytest.mark.django_db
+def test_popularity_counters_follow_create_cancel_and_recount(
+    client_user, master, services
+):
+    from bookings.popularity import recount
+    from bookings.services import create_booking
+
+    kept = create_booking(client_user, master, services, _visit_time(10))
+    cancelled = create_booking(
+        client_user, master, services[:1], _visit_time(14)
+    )
+    assert cancelled.cancel()
+
+    master.refresh_from_db()
+    assert (master.booking_count, master.recent_booking_count) == (1, 1)
+    counts = dict(Service.objects.values_list('title', 'booking_count'))
+    assert counts == {'Стрижка': 1, 'Укладка': 1}
+
+    # Старая запись выпадает из окна «30 дней» при пересчёте,
+    # разошедшиеся счётчики исправляются
+    Booking.objects.filter(pk=kept.pk).update(
+        created_at=timezone.now() - timedelta(days=40)
+    )
+    Service.objects.update(booking_count=7)
+    recount()
+    master.refresh_from_db()
+    assert (master.booking_count, master.recent_booking_count) == (1, 0)
+    assert set(Service.objects.values_list('booking_count', flat=True)) == {1}
+
+
+@pytest.mark.django_db
+def test_cancel_through_status_filtered_queryset_uncounts(
+    client_user, master, services
+):
+    """Отмена из списка админки с фильтром по статусу вычитает счётчики."""
+    from bookings.services import create_booking
+    from bookings.transitions import apply_transition
+
+    pending = create_booking(client_user, master, services, _visit_time(10))
+    confirmed = create_booking(
+        client_user, master, services[:1], _visit_time(14)
+    )
+    assert confirmed.transition_to('confirmed')
+
+    for status in ('pending', 'confirmed'):
+        result = apply_transition(
+            Booking.objects.filter(status=status), 'cancelled'
+        )
+        assert result == (1, 0)
+
+    assert set(
+        Booking.objects.filter(pk__in=[pending.pk, confirmed.pk])
+        .values_list('status', flat=True)
+    ) == {'cancelled'}
+    master.refresh_from_db()
+    assert (master.booking_count, master.recent_booking_count) == (0, 0)
+    assert set(Service.objects.values_list('booking_count', flat=True)) == {0}
+
+
+@pytest.mark.django_db
+def test_estimated_count_ignores_partial_index_stats(client_user, master):
+    from django.db import connection
+
+    from bookings.paginator import estimate_row_count
+
+    Booking.objects.bulk_create([
+        Booking(
+            user=client_user, master=master,
+            visit_datetime=_visit_time() + timedelta(days=i),
+            status='pending' if i % 10 == 0 else 'completed',
+        )
+        for i in range(50)
+    ])
+    # В статистике есть и частичный индекс активных записей (5 строк)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+        cursor.execute(
+            'SELECT stat FROM sqlite_stat1 WHERE idx = %s',
+            ['booking_active_master_idx']
+        )
+        assert cursor.fetchone()[0].split()[0] == '5'
+    assert estimate_row_count(Booking) == 50
+
+
+@pytest.mark.django_db
+def test_status_changes_outside_transitions_are_rejected(
+    admin_client, client_user, master
+):
+    from django.core.exceptions import ValidationError
+
+    booking = Booking.objects.create(
+        user=client_user, master=master, visit_datetime=_visit_time()
+    )
+    response = admin_client.get(
+        f'/admin/bookings/booking/{booking.pk}/change/'
+    )
+    assert 'name="status"' not in response.content.decode()
+
+    booking.status = 'confirmed'
+    booking.save()
+    assert booking.confirmed_at is not None
+
+    booking = Booking.objects.get(pk=booking.pk)
+    booking.status = 'pending'
+    with pytest.raises(ValidationError):
+        booking.save()
+
+
+@pytest.mark.django_db
+def test_cancel_through_save_updates_popularity_counters(
+    client_user, master, services
+):
+    booking = Booking.objects.create(
+        user=client_user, master=master, visit_datetime=_visit_time()
+    )
+    BookingService.objects.create(
+        booking=booking, service=services[0],
+        price_at_booking=services[0].price
+    )
+    master.refresh_from_db()
+    services[0].refresh_from_db()
+    assert (master.booking_count, services[0].booking_count) == (1, 1)
+
+    booking = Booking.objects.get(pk=booking.pk)
+    booking.status = 'cancelled'
+    booking.save()
+    master.refresh_from_db()
+    services[0].refresh_from_db()
+    assert (master.booking_count, services[0].booking_count) == (0, 0)
+    assert (master.recent_booking_count,
+            services[0].recent_booking_count) == (0, 0)
+
+
+@pytest.mark.django_db
+def test_clean_checks_overlap_in_db_not_in_cached_schedule(
+    client_user, master, django_capture_on_commit_callbacks
+):
+    from django.core.exceptions import ValidationError
+    from django.db import transaction
+
+    from bookings import availability
+
+    booking = Booking.objects.create(
+        user=client_user, master=master,
+        visit_datetime=_visit_time(10)
+    )
+    # Расписание дня закэшировано до записи другого процесса
+    availability.get_schedule(master.pk, _visit_time().date())
+    Booking.objects.bulk_create([Booking(
+        user=client_user, master=master, visit_datetime=_visit_time(12),
+        end_datetime=_visit_time(13),
+    )])
+    booking.visit_datetime = _visit_time(12)
+    with pytest.raises(ValidationError):
+        booking.save()
+
+    # В транзакции кэш сбрасывается ещё раз после COMMIT
+    with django_capture_on_commit_callbacks() as callbacks:
+        with transaction.atomic():
+            availability.invalidate(master.pk, _visit_time())
+    assert len(callbacks) == 1
+
+
+@pytest.mark.django_db
+def test_save_keeps_end_time_after_catalog_edit(
+    client_user, master, services
+):
+    """Правка каталога не переписывает время уже созданных записей."""
+    from bookings.services import create_booking
+
+    booking = create_booking(client_user, master, services, _visit_time())
+    end = booking.end_datetime
+    MasterService.objects.filter(master=master).update(duration_minutes=90)
+
+    booking = Booking.objects.get(pk=booking.pk)
+    booking.status = 'confirmed'
+    booking.save()
+    booking.refresh_from_db()
+    assert (booking.duration_minutes, booking.end_datetime) == (75, end)
+
+    # Смена мастера пересчитывает длительность по его времени
+    other = Master.objects.create(first_name='Ольга', last_name='Петрова')
+    MasterService.objects.bulk_create([
+        MasterService(master=other, service=service, duration_minutes=20)
+        for service in services
+    ])
+    booking.master = other
+    booking.save()
+    booking.refresh_from_db()
+    assert booking.duration_minutes == 40
+    assert booking.end_datetime == _visit_time() + timedelta(minutes=40)
@@ -0,0 +1,140 @@
+from datetime import datetime, time, timedelta
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from pages import stats
+from staff.models import Master, MasterService, Service
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+@pytest.fixture
+def catalog():
+    master = Master.objects.create(first_name='Анна', last_name='Иванова')
+    services = []
+    for title, price in (('Стрижка', 1000), ('Укладка', 2000)):
+        service = Service.objects.create(
+            title=title, price=price, duration_minutes=60
+        )
+        MasterService.objects.create(
+            master=master, service=service, duration_minutes=30
+        )
+        services.append(service)
+    return master, services
+
+
+@pytest.mark.django_db
+def test_home_stats_are_served_from_snapshot(client, catalog):
+    with CaptureQueriesContext(connection) as first:
+        response = client.get('/')
+    assert response.status_code == 200
+    assert response.context['stats'] == {
+        'total_masters': 1, 'total_services': 2, 'avg_price': 1500,
+    }
+    assert len(first) == 3
+
+    with CaptureQueriesContext(connection) as second:
+        client.get('/')
+    assert len(second) == 0
+
+
+@pytest.mark.django_db
+def test_new_booking_updates_snapshot_in_place(
+    catalog, django_capture_on_commit_callbacks
+):
+    from bookings.services import create_booking
+
+    master, services = catalog
+    stats.get_snapshot()
+    user = get_user_model().objects.create_user(username='client')
+    day = timezone.localdate() + timedelta(days=7)
+    when = timezone.make_aware(datetime.combine(day, time(12)))
+
+    with django_capture_on_commit_callbacks(execute=True):
+        create_booking(user, master, services[1:], when)
+    with CaptureQueriesContext(connection) as queries:
+        context = stats.home_context()
+    assert len(queries) == 0
+    assert context['featured_masters'][0]['booking_count'] == 1
+    assert [s['title'] for s in context['popular_services']] == [
+        'Укладка', 'Стрижка'
+    ]
+
+
+@pytest.mark.django_db
+def test_stale_snapshot_is_served_while_refreshing(monkeypatch, catalog):
+    class InlineThread:
+        def __init__(self, target, **kwargs):
+            self.target = target
+
+        def start(self):
+            self.target()
+
+    monkeypatch.setattr(stats.threading, 'Thread', InlineThread)
+    stats.get_snapshot()
+    Service.objects.create(title='Окрашивание', price=3000,
+                           duration_minutes=120)
+
+    # Каталог изменился: отдаём старый снимок, новый считается в фоне
+    served = stats.get_snapshot()
+    assert len(served['services']) == 2
+    assert len(cache.get(stats.SNAPSHOT_KEY)['services']) == 3
+    assert cache.get(stats.REFRESH_LOCK_KEY) is None
+
+
+@pytest.mark.django_db
+def test_rolled_back_counts_do_not_reach_snapshot(
+    catalog, django_capture_on_commit_callbacks
+):
+    from django.db import transaction
+
+    from bookings import popularity
+
+    master, _ = catalog
+    stats.get_snapshot()
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                popularity.change_counts({master.pk: (1, 1)}, {})
+                raise RuntimeError
+    assert callbacks == []
+    snapshot = cache.get(stats.SNAPSHOT_KEY)
+    assert snapshot['masters'][master.pk]['booking_count'] == 0
+
+
+@pytest.mark.django_db
+def test_recount_refreshes_snapshot_synchronously(monkeypatch, catalog):
+    from bookings import popularity
+
+    def no_threads(*args, **kwargs):
+        raise AssertionError('Пересчёт не должен уходить в фоновый поток')
+
+    monkeypatch.setattr(stats.threading, 'Thread', no_threads)
+    from bookings.services import create_booking
+
+    master, services = catalog
+    stats.get_snapshot()
+    user = get_user_model().objects.create_user(username='client')
+    day = timezone.localdate() + timedelta(days=7)
+    # Приращение до снимка не дошло (транзакция теста не фиксируется)
+    create_booking(
+        user, master, services, timezone.make_aware(
+            datetime.combine(day, time(12))
+        )
+    )
+    assert cache.get(stats.SNAPSHOT_KEY)['masters'][master.pk][
+        'booking_count'
+    ] == 0
+
+    popularity.recount()
+    snapshot = cache.get(stats.SNAPSHOT_KEY)
+    assert snapshot['masters'][master.pk]['booking_count'] == 1
+    assert cache.get(stats.REFRESH_LOCK_KEY) is None
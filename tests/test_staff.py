@@ -0,0 +1,294 @@
+import pytest
+from django.core.cache import cache
+from django.urls import include, path
+
+from staff.models import Master, MasterService, Service
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+def _create_masters(count, services_per_master=4):
+    services = [
+        Service.objects.create(
+            title=f'Услуга {i}', price=1000, duration_minutes=60
+        )
+        for i in range(services_per_master)
+    ]
+    hidden = Service.objects.create(
+        title='Скрытая', price=1000, duration_minutes=60, is_published=False
+    )
+    for i in range(count):
+        master = Master.objects.create(first_name='Мастер', last_name=str(i))
+        MasterService.objects.bulk_create([
+            MasterService(master=master, service=service, duration_minutes=30)
+            for service in services + [hidden]
+        ])
+
+
+@pytest.mark.django_db
+def test_master_list_query_count_does_not_grow_with_masters(
+    client, django_assert_num_queries
+):
+    _create_masters(2)
+    # Состояние каталога для ETag, COUNT для пагинатора, мастера с числом
+    # услуг, услуги мастеров
+    with django_assert_num_queries(4):
+        small = client.get('/staff/masters/')
+    _create_masters(10)
+    with django_assert_num_queries(4):
+        large = client.get('/staff/masters/')
+
+    assert len(small.context['masters']) == 2
+    assert len(large.context['masters']) == 12
+    master = large.context['masters'][0]
+    assert master.published_services_count == 4
+    assert 'Скрытая' not in [s.title for s in master.published_services]
+
+
+@pytest.mark.django_db
+def test_master_list_is_paginated(client):
+    _create_masters(13, services_per_master=1)
+    response = client.get('/staff/masters/')
+    assert response.context['is_paginated']
+    assert len(response.context['masters']) == 12
+    response = client.get('/staff/masters/?page=2')
+    assert len(response.context['masters']) == 1
+
+
+@pytest.mark.django_db
+def test_duration_grid_renders_in_one_query(django_assert_num_queries):
+    from django.template import Context, Template
+
+    from staff.durations import matrix_scope
+
+    _create_masters(20, services_per_master=30)
+    masters = list(Master.objects.all())
+    services = list(Service.objects.all())
+    template = Template(
+        '{% load master_extras %}{% for m in masters %}{% for s in services %}'
+        '{{ m|duration_for:s }};{% endfor %}{% endfor %}'
+    )
+    with matrix_scope(), django_assert_num_queries(1):
+        html = template.render(Context({
+            'masters': masters, 'services': services,
+        }))
+    assert html.count('30;') == 20 * 31
+
+
+def duration_grid(request):
+    from django.http import HttpResponse
+    from django.template import Context, Template
+
+    template = Template(
+        '{% load master_extras %}{% for m in masters %}{% for s in services %}'
+        '{{ m|duration_for:s }};{% endfor %}{% endfor %}'
+    )
+    return HttpResponse(template.render(Context({
+        'masters': Master.objects.all(), 'services': Service.objects.all(),
+    })))
+
+
+urlpatterns = [
+    path('grid/', duration_grid),
+    path('', include('salon.urls')),
+]
+
+
+@pytest.mark.django_db
+@pytest.mark.urls(__name__)
+def test_duration_grid_request_uses_request_matrix(
+    client, django_assert_num_queries
+):
+    """Матрица живёт один запрос: число запросов не зависит от сетки."""
+    _create_masters(2, services_per_master=3)
+    # Мастера, услуги, матрица времени
+    with django_assert_num_queries(3):
+        small = client.get('/grid/')
+    _create_masters(10, services_per_master=3)
+    with django_assert_num_queries(3):
+        large = client.get('/grid/')
+    assert small.content.decode().count('30;') == 2 * 4
+    assert large.content.decode().count('30;') == 12 * 4
+
+    # Следующий запрос видит изменения каталога
+    MasterService.objects.update(duration_minutes=45)
+    with django_assert_num_queries(3):
+        response = client.get('/grid/')
+    assert response.content.decode().count('45;') == 12 * 4
+
+
+@pytest.mark.django_db
+def test_service_page_is_built_once_and_cached(
+    client, django_assert_num_queries
+):
+    _create_masters(10, services_per_master=1)
+    service = Service.objects.get(title='Услуга 0')
+    hidden = Master.objects.create(
+        first_name='Скрытый', last_name='Мастер', is_published=False
+    )
+    MasterService.objects.create(
+        master=hidden, service=service, duration_minutes=30
+    )
+    fast = Master.objects.get(last_name='7')
+    MasterService.objects.filter(master=fast).update(duration_minutes=20)
+
+    # Услуга, мастера, записи мастеров за окно поиска
+    with django_assert_num_queries(3):
+        response = client.get(f'/staff/services/{service.pk}/')
+    masters = response.context['masters_with_time']
+    assert len(masters) == 10
+    assert masters[0]['name'] == 'Мастер 7'
+    assert [m['duration_minutes'] for m in masters] == [20] + [30] * 9
+    assert all(m['next_slot'] for m in masters)
+    assert 'Скрытый' not in response.content.decode()
+
+    with django_assert_num_queries(0):
+        client.get(f'/staff/services/{service.pk}/')
+
+
+@pytest.mark.django_db
+def test_service_page_conditional_get_and_invalidation(client):
+    _create_masters(2, services_per_master=1)
+    service = Service.objects.get(title='Услуга 0')
+    url = f'/staff/services/{service.pk}/'
+
+    response = client.get(url)
+    etag = response['ETag']
+    assert response.has_header('Last-Modified')
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    # Изменение времени мастера сбрасывает данные страницы
+    link = MasterService.objects.filter(service=service).first()
+    link.duration_minutes = 45
+    link.save()
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert '45 мин' in response.content.decode()
+
+    assert client.get('/staff/services/999999/').status_code == 404
+
+
+@pytest.mark.django_db
+def test_matrix_is_built_in_one_query_and_cached(
+    client, django_assert_num_queries
+):
+    from django.contrib.auth import get_user_model
+
+    _create_masters(3, services_per_master=2)
+    admin = get_user_model().objects.create_superuser(
+        username='admin', password='password'
+    )
+    client.force_login(admin)
+
+    response = client.get('/staff/matrix/?format=json')
+    data = response.json()
+    assert [m['name'] for m in data['masters']] == [
+        'Мастер 0', 'Мастер 1', 'Мастер 2'
+    ]
+    assert [s['title'] for s in data['services']] == [
+        'Скрытая', 'Услуга 0', 'Услуга 1'
+    ]
+    assert data['durations'] == [[30, 30, 30]] * 3
+    assert 'Мастер 2' in client.get('/staff/matrix/').content.decode()
+
+    # Повторно — из кэша: сессия, пользователь и состояние каталога
+    with django_assert_num_queries(3):
+        response = client.get('/staff/matrix/?format=csv')
+    lines = response.content.decode('utf-8-sig').splitlines()
+    assert lines[0] == 'Мастер,Скрытая,Услуга 0,Услуга 1'
+
+    # Изменение MasterService меняет версию каталога и матрицу
+    MasterService.objects.filter(service__title='Скрытая').delete()
+    data = client.get('/staff/matrix/?format=json').json()
+    assert [s['title'] for s in data['services']] == ['Услуга 0', 'Услуга 1']
+
+
+@pytest.mark.django_db
+def test_matrix_requires_permission(client, django_user_model):
+    user = django_user_model.objects.create_user(username='client')
+    client.force_login(user)
+    assert client.get('/staff/matrix/').status_code == 403
+
+
+def _page(response):
+    # Страница без панели django-debug-toolbar, которая меняется на каждый запрос
+    return response.content.decode().split('<div id="djDebug"')[0]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url', [
+    '/staff/masters/', '/staff/services/', '/about/', '/contacts/'
+])
+def test_anonymous_catalog_pages_are_served_from_cache(
+    client, django_assert_num_queries, url
+):
+    _create_masters(2, services_per_master=1)
+    first = client.get(url)
+    assert first.status_code == 200
+    with django_assert_num_queries(0):
+        second = client.get(url)
+    assert _page(second) == _page(first)
+
+
+@pytest.mark.django_db
+def test_page_cache_varies_on_auth_and_follows_catalog(
+    client, django_assert_num_queries
+):
+    from django.contrib.auth import get_user_model
+
+    _create_masters(2, services_per_master=1)
+    anonymous = _page(client.get('/staff/masters/'))
+    assert 'Записаться' not in anonymous
+
+    # Изменение мастера сбрасывает страницу
+    Master.objects.filter(last_name='0').update(is_published=False)
+    Master.objects.get(last_name='1').save()
+    assert 'Мастер 0' not in _page(client.get('/staff/masters/'))
+
+    user = get_user_model().objects.create_user(
+        username='client', password='password'
+    )
+    client.force_login(user)
+    # Сессия, пользователь, состояние каталога, COUNT и мастера с услугами
+    with django_assert_num_queries(6):
+        page = _page(client.get('/staff/masters/'))
+    assert 'Записаться' in page
+    # Повторно блок мастеров берётся из кэша фрагментов
+    with django_assert_num_queries(4):
+        assert _page(client.get('/staff/masters/')) == page
+
+
+@pytest.mark.django_db
+def test_catalog_pages_answer_304_from_updated_at(
+    client, django_assert_num_queries
+):
+    from django.contrib.auth import get_user_model
+
+    _create_masters(2, services_per_master=1)
+    user = get_user_model().objects.create_user(
+        username='client', password='password'
+    )
+    client.force_login(user)
+    response = client.get('/staff/masters/')
+    etag = response['ETag']
+    assert response.has_header('Last-Modified')
+
+    # Сессия, пользователь и один запрос MAX(updated_at) — без шаблона
+    with django_assert_num_queries(3):
+        response = client.get('/staff/masters/', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+
+    # Удаление не меняет MAX(updated_at), но меняет ETag
+    MasterService.objects.filter(master__last_name='0').first().delete()
+    response = client.get('/staff/masters/', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+
+    # Другой пользователь получает свою шапку, а не 304
+    client.logout()
+    assert client.get(
+        '/staff/masters/', HTTP_IF_NONE_MATCH=response['ETag']
+    ).status_code == 200